@@ -1,8 +1,219 @@
+import hashlib
+import itertools
+import json
+import os
+import platform
+import struct
+import time
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np
-import matplotlib.pyplot as plt
+
+
+def _check_params(params, n_params, dtype):
+    """Проверка готового буфера параметров"""
+    if params.shape != (n_params,) or params.dtype != dtype:
+        raise ValueError(f"Ожидался буфер параметров формы ({n_params},) и типа {dtype}, "
+                         f"получен {params.shape} {params.dtype}")
+    return params
+
+
+def _flat_views(buffer, shapes):
+    """Нарезка плоского буфера на представления заданных форм"""
+    views = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        views.append(buffer[offset:offset + size].reshape(shape))
+        offset += size
+    return views
+
+
+# Функции активации для DeepNeuralNetwork.
+# forward(z, out) пишет активацию в out,
+# backward(dz, z, a, buf) домножает dz на производную на месте (buf - рабочий буфер).
+def _relu_forward(z, out):
+    np.maximum(z, 0, out=out)
+
+def _relu_backward(dz, z, a, buf):
+    np.greater(z, 0, out=buf)
+    dz *= buf
+
+def _tanh_forward(z, out):
+    np.tanh(z, out=out)
+
+def _tanh_backward(dz, z, a, buf):
+    # 1 - tanh(z)^2
+    np.multiply(a, a, out=buf)
+    np.subtract(1, buf, out=buf)
+    dz *= buf
+
+def _sigmoid_forward(z, out):
+    np.negative(z, out=out)
+    np.exp(out, out=out)
+    out += 1
+    np.reciprocal(out, out=out)
+
+def _sigmoid_backward(dz, z, a, buf):
+    # sigmoid(z) * (1 - sigmoid(z))
+    np.subtract(1, a, out=buf)
+    buf *= a
+    dz *= buf
+
+def _linear_forward(z, out):
+    np.copyto(out, z)
+
+def _linear_backward(dz, z, a, buf):
+    pass
+
+ACTIVATIONS = {
+    "relu": (_relu_forward, _relu_backward),
+    "tanh": (_tanh_forward, _tanh_backward),
+    "sigmoid": (_sigmoid_forward, _sigmoid_backward),
+    "linear": (_linear_forward, _linear_backward),
+}
+
+
+class SGD:
+    def __init__(self, momentum=0.0):
+        """
+        Стохастический градиентный спуск (с моментом при momentum > 0)
+        
+        Все оптимизаторы обновляют плоский буфер параметров на месте,
+        буферы состояния выделяются при первом шаге и дальше переиспользуются.
+        """
+        self.momentum = momentum
+        self.velocity = None
+        self._scratch = None
+    
+    def step(self, params, grads, learning_rate):
+        """Один шаг оптимизации"""
+        if self._scratch is None:
+            self._scratch = np.empty_like(params)
+        if self.momentum and self.velocity is None:
+            self.velocity = np.zeros_like(params)
+        
+        if self.momentum:
+            # v = momentum * v + g
+            self.velocity *= self.momentum
+            self.velocity += grads
+            grads = self.velocity
+        np.multiply(grads, learning_rate, out=self._scratch)
+        params -= self._scratch
+
+
+class RMSProp:
+    def __init__(self, rho=0.9, eps=1e-8):
+        """RMSProp: шаг нормируется на скользящее среднее квадрата градиента"""
+        self.rho = rho
+        self.eps = eps
+        self.square_avg = None
+        self._scratch = None
+    
+    def step(self, params, grads, learning_rate):
+        """Один шаг оптимизации"""
+        if self._scratch is None:
+            self._scratch = np.empty_like(params)
+        if self.square_avg is None:
+            self.square_avg = np.zeros_like(params)
+        
+        scratch = self._scratch
+        # s = rho * s + (1 - rho) * g^2
+        np.multiply(grads, grads, out=scratch)
+        scratch *= 1 - self.rho
+        self.square_avg *= self.rho
+        self.square_avg += scratch
+        
+        # params -= lr * g / (sqrt(s) + eps)
+        np.sqrt(self.square_avg, out=scratch)
+        scratch += self.eps
+        np.divide(grads, scratch, out=scratch)
+        scratch *= learning_rate
+        params -= scratch
+
+
+class Adam:
+    def __init__(self, beta1=0.9, beta2=0.999, eps=1e-8):
+        """Adam: моменты первого и второго порядка с коррекцией смещения"""
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.t = 0
+        self.m = None
+        self.v = None
+        self._scratch = None
+    
+    def step(self, params, grads, learning_rate):
+        """Один шаг оптимизации"""
+        if self._scratch is None:
+            self._scratch = np.empty_like(params)
+        if self.m is None:
+            self.m = np.zeros_like(params)
+            self.v = np.zeros_like(params)
+        
+        self.t += 1
+        scratch = self._scratch
+        
+        # m = beta1 * m + (1 - beta1) * g
+        self.m *= self.beta1
+        np.multiply(grads, 1 - self.beta1, out=scratch)
+        self.m += scratch
+        
+        # v = beta2 * v + (1 - beta2) * g^2
+        self.v *= self.beta2
+        np.multiply(grads, grads, out=scratch)
+        scratch *= 1 - self.beta2
+        self.v += scratch
+        
+        # Коррекция смещения свёрнута в скорость обучения
+        # float(), чтобы скаляр float64 не повышал точность вычислений во float32
+        step_size = float(learning_rate * np.sqrt(1 - self.beta2 ** self.t) / (1 - self.beta1 ** self.t))
+        np.sqrt(self.v, out=scratch)
+        scratch += self.eps
+        np.divide(self.m, scratch, out=scratch)
+        scratch *= step_size
+        params -= scratch
+
+
+OPTIMIZERS = {
+    "sgd": SGD,
+    "momentum": lambda: SGD(momentum=0.9),
+    "rmsprop": RMSProp,
+    "adam": Adam,
+}
+
+
+# Классы оптимизаторов по имени - для восстановления состояния из файла
+OPTIMIZER_CLASSES = {cls.__name__: cls for cls in (SGD, RMSProp, Adam)}
+
+
+def make_optimizer(optimizer):
+    """Оптимизатор по имени из OPTIMIZERS или уже созданный объект"""
+    if isinstance(optimizer, str):
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f"Неизвестный оптимизатор: {optimizer}. "
+                             f"Доступны: {', '.join(OPTIMIZERS)}")
+        return OPTIMIZERS[optimizer]()
+    return optimizer
+
+
+# Сигнатура и выравнивание данных в файле модели (SimpleNeuralNetwork.save)
+MODEL_MAGIC = b"SNNMODEL"
+MODEL_ALIGNMENT = 64
+
+
+def _align(offset):
+    """Округление смещения вверх до MODEL_ALIGNMENT"""
+    return -(-offset // MODEL_ALIGNMENT) * MODEL_ALIGNMENT
+
 
 class SimpleNeuralNetwork:
-    def __init__(self, input_size=1, hidden_size=3, output_size=1, learning_rate=0.01):
+    def __init__(self, input_size=1, hidden_size=3, output_size=1, learning_rate=0.01,
+                 seed=None, use_workspace=True, optimizer="sgd", dtype=np.float64,
+                 params=None):
         """
         Простая нейронная сеть с одним скрытым слоем
         
@@ -11,15 +222,75 @@ class SimpleNeuralNetwork:
         hidden_size: количество нейронов в скрытом слое
         output_size: количество выходных нейронов
         learning_rate: скорость обучения
+        seed: зерно генератора для инициализации весов и перемешивания
+              (None - глобальный генератор np.random)
+        use_workspace: переиспользовать заранее выделенные буферы
+                       в forward/backward/update_parameters
+        optimizer: "sgd", "momentum", "rmsprop", "adam" или объект с методом step
+        dtype: тип вычислений (np.float32 вдвое сокращает трафик памяти)
+        params: готовый плоский буфер параметров (например, отображённый
+                в память файл модели); веса тогда не инициализируются
         """
-        # Инициализация весов и смещений
-        self.W1 = np.random.randn(input_size, hidden_size) * 0.01
-        self.b1 = np.zeros((1, hidden_size))
-        self.W2 = np.random.randn(hidden_size, output_size) * 0.01
-        self.b2 = np.zeros((1, output_size))
+        self.dtype = np.dtype(dtype)
+        self._rng = np.random if seed is None else np.random.RandomState(seed)
+        self._config = {"input_size": input_size, "hidden_size": hidden_size,
+                        "output_size": output_size, "dtype": self.dtype.name}
+        
+        # Все параметры лежат в одном плоском буфере, W1/b1/W2/b2 - его представления
+        shapes = [(input_size, hidden_size), (1, hidden_size),
+                  (hidden_size, output_size), (1, output_size)]
+        n_params = sum(int(np.prod(shape)) for shape in shapes)
+        if params is None:
+            self.params = np.zeros(n_params, dtype=self.dtype)
+            self.W1, self.b1, self.W2, self.b2 = _flat_views(self.params, shapes)
+            
+            # Инициализация весов и смещений
+            self.W1[...] = self._rng.randn(input_size, hidden_size) * 0.01
+            self.W2[...] = self._rng.randn(hidden_size, output_size) * 0.01
+        else:
+            self.params = _check_params(params, n_params, self.dtype)
+            self.W1, self.b1, self.W2, self.b2 = _flat_views(self.params, shapes)
         
         self.learning_rate = learning_rate
-        self.loss_history = []
+        self.optimizer = make_optimizer(optimizer)
+        self.loss_history = np.empty(0)
+        self.val_loss_history = np.empty(0)
+        
+        self.use_workspace = use_workspace
+        self._workspace = None
+    
+    def _get_workspace(self, m):
+        """
+        Буферы промежуточных значений для батча из m примеров
+        
+        Буферы выделяются один раз (и пересоздаются только при росте
+        батча), дальше forward/backward пишут в них через out=.
+        """
+        ws = self._workspace
+        if ws is None or ws["capacity"] < m:
+            hidden_size = self.W1.shape[1]
+            output_size = self.W2.shape[1]
+            # Градиенты в плоском буфере той же раскладки, что и self.params
+            grads = np.empty_like(self.params)
+            dW1, db1, dW2, db2 = _flat_views(
+                grads, [self.W1.shape, self.b1.shape, self.W2.shape, self.b2.shape])
+            ws = {
+                "capacity": m,
+                "z1": np.empty((m, hidden_size), dtype=self.dtype),
+                "a1": np.empty((m, hidden_size), dtype=self.dtype),
+                "z2": np.empty((m, output_size), dtype=self.dtype),
+                "dz2": np.empty((m, output_size), dtype=self.dtype),
+                "dz1": np.empty((m, hidden_size), dtype=self.dtype),
+                "mask": np.empty((m, hidden_size), dtype=bool),
+                # Градиенты
+                "grads": grads,
+                "dW1": dW1,
+                "db1": db1,
+                "dW2": dW2,
+                "db2": db2,
+            }
+            self._workspace = ws
+        return ws
     
     def relu(self, x):
         """Функция активации ReLU"""
@@ -27,12 +298,18 @@ class SimpleNeuralNetwork:
     
     def relu_derivative(self, x):
         """Производная ReLU"""
-        return (x > 0).astype(float)
+        return (x > 0).astype(self.dtype)
     
     def forward(self, X):
         """
         Прямой проход через сеть
+        
+        В режиме use_workspace результат - представление внутреннего
+        буфера, которое перезаписывается следующим вызовом forward.
         """
+        if self.use_workspace:
+            return self._forward_workspace(X)
+        
         # Скрытый слой
         self.z1 = np.dot(X, self.W1) + self.b1
         self.a1 = self.relu(self.z1)
@@ -41,14 +318,40 @@ class SimpleNeuralNetwork:
         self.z2 = np.dot(self.a1, self.W2) + self.b2
         return self.z2
     
+    def _forward_workspace(self, X):
+        """Прямой проход без выделения памяти"""
+        m = X.shape[0]
+        ws = self._get_workspace(m)
+        z1, a1, z2 = ws["z1"][:m], ws["a1"][:m], ws["z2"][:m]
+        
+        np.dot(X, self.W1, out=z1)
+        z1 += self.b1
+        np.maximum(z1, 0, out=a1)
+        
+        np.dot(a1, self.W2, out=z2)
+        z2 += self.b2
+        
+        self.z1, self.a1, self.z2 = z1, a1, z2
+        return z2
+    
     def compute_loss(self, y_pred, y_true):
         """Среднеквадратичная ошибка"""
+        if self.use_workspace:
+            # Разность пишется в буфер dz2, backward всё равно его перезапишет
+            m = y_pred.shape[0]
+            diff = self._get_workspace(m)["dz2"][:m]
+            np.subtract(y_pred, y_true, out=diff)
+            flat = diff.reshape(-1)
+            return float(np.dot(flat, flat)) / flat.size
         return np.mean((y_pred - y_true) ** 2)
     
     def backward(self, X, y_true, y_pred):
         """
         Обратное распространение ошибки
         """
+        if self.use_workspace:
+            return self._backward_workspace(X, y_true, y_pred)
+        
         m = X.shape[0]
         
         # Градиенты выходного слоя
@@ -63,67 +366,1030 @@ class SimpleNeuralNetwork:
         
         return dW1, db1, dW2, db2
     
+    def _backward_workspace(self, X, y_true, y_pred):
+        """
+        Обратное распространение без выделения памяти
+        
+        Возвращаемые градиенты - буферы workspace, они перезаписываются
+        следующим вызовом backward.
+        """
+        m = X.shape[0]
+        ws = self._get_workspace(m)
+        dz2, dz1, mask = ws["dz2"][:m], ws["dz1"][:m], ws["mask"][:m]
+        dW1, db1, dW2, db2 = ws["dW1"], ws["db1"], ws["dW2"], ws["db2"]
+        
+        # Градиенты выходного слоя
+        np.subtract(y_pred, y_true, out=dz2)
+        dz2 *= 2.0 / m
+        np.dot(self.a1.T, dz2, out=dW2)
+        np.sum(dz2, axis=0, keepdims=True, out=db2)
+        
+        # Градиенты скрытого слоя
+        np.dot(dz2, self.W2.T, out=dz1)
+        np.greater(self.z1, 0, out=mask)
+        np.multiply(dz1, mask, out=dz1)
+        np.dot(X.T, dz1, out=dW1)
+        np.sum(dz1, axis=0, keepdims=True, out=db1)
+        
+        return dW1, db1, dW2, db2
+    
     def update_parameters(self, dW1, db1, dW2, db2):
         """Обновление весов"""
+        if self.use_workspace:
+            ws = self._get_workspace(0)
+            if not (dW1 is ws["dW1"] and db1 is ws["db1"]
+                    and dW2 is ws["dW2"] and db2 is ws["db2"]):
+                ws["dW1"][...], ws["db1"][...] = dW1, db1
+                ws["dW2"][...], ws["db2"][...] = dW2, db2
+            # Один шаг оптимизатора по всему плоскому буферу параметров
+            self.optimizer.step(self.params, ws["grads"], self.learning_rate)
+            return
+        
+        if not (isinstance(self.optimizer, SGD) and not self.optimizer.momentum):
+            grads = np.concatenate([dW1.ravel(), db1.ravel(), dW2.ravel(), db2.ravel()])
+            self.optimizer.step(self.params, grads, self.learning_rate)
+            return
+        
         self.W1 -= self.learning_rate * dW1
         self.b1 -= self.learning_rate * db1
         self.W2 -= self.learning_rate * dW2
         self.b2 -= self.learning_rate * db2
     
-    def train(self, X, y, epochs=1000, verbose=True):
-        """Обучение сети"""
-        for epoch in range(epochs):
-            # Прямой проход
-            y_pred = self.forward(X)
+    def train(self, X, y, epochs=1000, verbose=True, batch_size=None, shuffle=True,
+              validation_split=0.0, validation_data=None, eval_every=1,
+              patience=None, min_delta=0.0, restore_best=True,
+              lr_patience=None, lr_factor=0.5, min_lr=1e-6, n_workers=None):
+        """
+        Обучение сети
+        
+        X и y приводятся к self.dtype, чтобы вычисления не повышали точность.
+        batch_size: размер мини-батча (None - полный батч на каждой эпохе)
+        shuffle: перемешивать порядок примеров перед каждой эпохой
+        validation_split: доля последних примеров X, отводимая под валидацию
+        validation_data: явная валидационная выборка (X_val, y_val)
+        eval_every: проверять валидационную ошибку раз в столько эпох
+        patience: остановка, если ошибка не улучшилась за столько проверок
+                  (None - без ранней остановки)
+        min_delta: минимальное уменьшение ошибки, считающееся улучшением
+        restore_best: вернуть параметры с лучшей ошибкой после остановки
+        lr_patience: уменьшать learning_rate в lr_factor раз, если ошибка
+                     не улучшилась за столько проверок (не ниже min_lr)
+        n_workers: data-parallel режим - каждый батч делится между столькими
+                   процессами, градиенты шардов усредняются в главном процессе
+        
+        Без валидационной выборки отслеживается ошибка на обучении.
+        Возвращает количество выполненных эпох.
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        y = np.asarray(y, dtype=self.dtype)
+        
+        if validation_data is None and validation_split > 0:
+            n_val = max(1, int(X.shape[0] * validation_split))
+            validation_data = (X[-n_val:], y[-n_val:])
+            X, y = X[:-n_val], y[:-n_val]
+        if validation_data is not None:
+            X_val = np.asarray(validation_data[0], dtype=self.dtype)
+            y_val = np.asarray(validation_data[1], dtype=self.dtype)
+            # Буфер предсказаний на валидации: считаются через _infer, а не
+            # forward, чтобы не раздувать workspace обучения до размера X_val
+            val_pred = np.empty((X_val.shape[0], self._n_outputs()), dtype=self.dtype)
+            y_val = y_val.reshape(val_pred.shape)
+        
+        n_samples = X.shape[0]
+        if batch_size is None or batch_size >= n_samples:
+            batch_size = None
+            X_batch = y_batch = order = None
+        else:
+            # Буферы мини-батча выделяются один раз на весь train
+            X_batch = np.empty((batch_size,) + X.shape[1:], dtype=X.dtype)
+            y_batch = np.empty((batch_size,) + y.shape[1:], dtype=y.dtype)
+            order = np.arange(n_samples)
+        
+        # Ошибки пишутся в заранее выделенные буферы, а не в списки
+        losses = np.empty(epochs)
+        val_losses = np.empty(epochs // eval_every + 1)
+        n_val_evals = 0
+        
+        best_loss = np.inf
+        best_params = np.empty_like(self.params) if patience is not None and restore_best else None
+        wait = lr_wait = 0
+        epoch = -1
+        
+        parallel = self._start_parallel(X, y, n_workers) if n_workers and n_workers > 1 else None
+        try:
+            for epoch in range(epochs):
+                if parallel is not None:
+                    loss = self._train_parallel_epoch(parallel, batch_size or n_samples, shuffle)
+                elif batch_size is None:
+                    loss = self._train_full_batch_epoch(X, y)
+                else:
+                    loss = self._train_mini_batch_epoch(X, y, X_batch, y_batch, order, shuffle)
+                losses[epoch] = loss
+            
+                if verbose and epoch % 100 == 0:
+                    print(f"Эпоха {epoch}: Loss = {loss:.6f}")
+            
+                if (epoch + 1) % eval_every:
+                    continue
+            
+                if validation_data is not None:
+                    monitored = self._validation_loss(X_val, y_val, val_pred,
+                                                      batch_size or X_val.shape[0])
+                    val_losses[n_val_evals] = monitored
+                    n_val_evals += 1
+                else:
+                    monitored = loss
+            
+                if monitored < best_loss - min_delta:
+                    best_loss = monitored
+                    wait = lr_wait = 0
+                    if best_params is not None:
+                        np.copyto(best_params, self.params)
+                    continue
+            
+                wait += 1
+                lr_wait += 1
+                if lr_patience is not None and lr_wait >= lr_patience and self.learning_rate > min_lr:
+                    self.learning_rate = max(self.learning_rate * lr_factor, min_lr)
+                    lr_wait = 0
+                    if verbose:
+                        print(f"Эпоха {epoch}: learning_rate уменьшен до {self.learning_rate:.2e}")
+                if patience is not None and wait >= patience:
+                    if verbose:
+                        print(f"Эпоха {epoch}: ранняя остановка, лучшая ошибка {best_loss:.6f}")
+                    if best_params is not None:
+                        np.copyto(self.params, best_params)
+                    break
+        
+        finally:
+            if parallel is not None:
+                self._stop_parallel(parallel)
+        
+        n_epochs = epoch + 1
+        self.loss_history = np.concatenate([self.loss_history, losses[:n_epochs]])
+        self.val_loss_history = np.concatenate([self.val_loss_history, val_losses[:n_val_evals]])
+        return n_epochs
+    
+    def _validation_loss(self, X_val, y_val, out, chunk_size):
+        """
+        MSE на валидации кусками по chunk_size строк
+        
+        Идёт через stateless _infer: workspace обучения не трогается,
+        а промежуточные значения ограничены размером куска.
+        """
+        for start in range(0, X_val.shape[0], chunk_size):
+            stop = start + chunk_size
+            self._infer(X_val[start:stop], out[start:stop])
+        np.subtract(out, y_val, out=out)
+        flat = out.reshape(-1)
+        return float(np.dot(flat, flat)) / flat.size
+    
+    def _start_parallel(self, X, y, n_workers):
+        """
+        Запуск пула процессов для data-parallel обучения
+        
+        Параметры, X, y, порядок примеров и градиенты шардов лежат
+        в разделяемой памяти: воркеры читают актуальные веса без
+        копирования и пишут градиенты каждый в свою строку матрицы.
+        """
+        n_samples = X.shape[0]
+        arrays = {
+            "params": self.params,
+            "X": X,
+            "y": y,
+            "order": np.arange(n_samples),
+            "grads": np.zeros((n_workers, self.params.size), dtype=self.dtype),
+        }
+        blocks = {}
+        shared = {}
+        try:
+            for name, arr in arrays.items():
+                blocks[name] = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+                shared[name] = np.ndarray(arr.shape, dtype=arr.dtype, buffer=blocks[name].buf)
+                shared[name][...] = arr
+            specs = {name: (blocks[name].name, arr.shape, arr.dtype.str)
+                     for name, arr in arrays.items()}
+            pool = multiprocessing.Pool(n_workers, initializer=_parallel_worker_init,
+                                        initargs=(type(self).__name__, self._config, specs))
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        
+        return {
+            "pool": pool,
+            "blocks": blocks,
+            "shared": shared,
+            "n_workers": n_workers,
+            "combined": np.empty_like(self.params),
+            "shard_weights": np.empty(n_workers, dtype=self.dtype),
+        }
+    
+    def _stop_parallel(self, parallel):
+        """Остановка пула и освобождение разделяемой памяти"""
+        parallel["pool"].terminate()
+        parallel["pool"].join()
+        parallel["shared"].clear()
+        for block in parallel["blocks"].values():
+            block.close()
+            block.unlink()
+    
+    def _train_parallel_epoch(self, parallel, batch_size, shuffle):
+        """
+        Эпоха data-parallel обучения
+        
+        Каждый батч делится на n_workers шардов; градиенты шардов
+        (посчитанные со своим m) взвешиваются долей шарда в батче
+        и сводятся одним матричным умножением.
+        """
+        shared = parallel["shared"]
+        n_workers = parallel["n_workers"]
+        weights = parallel["shard_weights"]
+        combined = parallel["combined"]
+        order = shared["order"]
+        n_samples = order.shape[0]
+        if shuffle:
+            self._rng.shuffle(order)
+        
+        epoch_loss = 0.0
+        for start in range(0, n_samples, batch_size):
+            stop = min(start + batch_size, n_samples)
+            bounds = np.linspace(start, stop, n_workers + 1).astype(int)
+            tasks = [(k, int(bounds[k]), int(bounds[k + 1]))
+                     for k in range(n_workers) if bounds[k + 1] > bounds[k]]
+            
+            shard_losses = parallel["pool"].starmap(_parallel_shard_step, tasks)
+            epoch_loss += sum(shard_losses)
             
-            # Вычисление потерь
-            loss = self.compute_loss(y_pred, y)
-            self.loss_history.append(loss)
+            weights[:] = 0
+            for k, lo, hi in tasks:
+                weights[k] = (hi - lo) / (stop - start)
+            np.dot(weights, shared["grads"], out=combined)
             
-            # Обратное распространение
-            dW1, db1, dW2, db2 = self.backward(X, y, y_pred)
+            self.optimizer.step(self.params, combined, self.learning_rate)
+            np.copyto(shared["params"], self.params)
+        
+        return epoch_loss / n_samples
+    
+    def _train_full_batch_epoch(self, X, y):
+        """Эпоха полнобатчевого градиентного спуска по всему X"""
+        # Прямой проход
+        y_pred = self.forward(X)
+        
+        # Вычисление потерь
+        loss = self.compute_loss(y_pred, y)
+        
+        # Обратное распространение
+        grads = self.backward(X, y, y_pred)
+        
+        # Обновление параметров
+        self.update_parameters(*grads)
+        return loss
+    
+    def _train_mini_batch_epoch(self, X, y, X_batch, y_batch, order, shuffle):
+        """
+        Эпоха мини-батчевого градиентного спуска
+        
+        Батчи собираются по перестановке индексов в заранее выделенные
+        буферы, поэтому память на эпоху не зависит от размера датасета.
+        """
+        n_samples = X.shape[0]
+        batch_size = X_batch.shape[0]
+        if shuffle:
+            self._rng.shuffle(order)
+        
+        epoch_loss = 0.0
+        for start in range(0, n_samples, batch_size):
+            idx = order[start:start + batch_size]
+            n_batch = idx.shape[0]
+            Xb = X_batch[:n_batch]
+            yb = y_batch[:n_batch]
+            np.take(X, idx, axis=0, out=Xb)
+            np.take(y, idx, axis=0, out=yb)
             
-            # Обновление параметров
-            self.update_parameters(dW1, db1, dW2, db2)
+            y_pred = self.forward(Xb)
+            epoch_loss += self.compute_loss(y_pred, yb) * n_batch
             
-            if verbose and epoch % 100 == 0:
-                print(f"Эпоха {epoch}: Loss = {loss:.6f}")
+            grads = self.backward(Xb, yb, y_pred)
+            self.update_parameters(*grads)
+        
+        # Средняя по эпохе ошибка (взвешенная по размеру батчей)
+        return epoch_loss / n_samples
+    
+    def _n_outputs(self):
+        """Количество выходных нейронов"""
+        return self.W2.shape[1]
     
-    def predict(self, X):
-        """Предсказание"""
-        return self.forward(X)
+    def _infer(self, X, out):
+        """
+        Прямой проход только для инференса: пишет результат в out
+        
+        В отличие от forward не трогает workspace и атрибуты z1/a1/z2,
+        поэтому безопасен при одновременном вызове из нескольких потоков.
+        """
+        a1 = np.dot(X, self.W1)
+        a1 += self.b1
+        np.maximum(a1, 0, out=a1)
+        np.dot(a1, self.W2, out=out)
+        out += self.b2
+        return out
+    
+    def predict(self, X, chunk_size=None, n_jobs=None):
+        """
+        Предсказание
+        
+        Не меняет состояние модели. X - массив или np.memmap.
+        chunk_size: обрабатывать X кусками по столько строк - память
+                    на промежуточные значения ограничена размером куска,
+                    а из memmap читается только текущий кусок
+        n_jobs: число потоков для параллельной обработки кусков
+                (матричное умножение NumPy отпускает GIL)
+        """
+        n_samples = len(X)
+        out = np.empty((n_samples, self._n_outputs()), dtype=self.dtype)
+        if chunk_size is None:
+            chunk_size = n_samples if n_jobs is None else -(-n_samples // n_jobs)
+        chunk_size = max(1, chunk_size)
+        
+        def run_chunk(start):
+            stop = min(start + chunk_size, n_samples)
+            self._infer(np.asarray(X[start:stop], dtype=self.dtype), out[start:stop])
+        
+        starts = range(0, n_samples, chunk_size)
+        if n_jobs is None or n_jobs <= 1 or len(starts) <= 1:
+            for start in starts:
+                run_chunk(start)
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+                # list() пробрасывает исключения из потоков
+                list(pool.map(run_chunk, starts))
+        return out
+    
+    def predict_stream(self, batches, chunk_size=1024):
+        """
+        Предсказание для итератора/генератора входных данных
+        
+        batches - итерируемый объект строк (1D) или пачек строк (2D)
+        произвольного размера. Они перегруппировываются в куски ровно
+        по chunk_size строк (последний - короче) в заранее выделенном
+        буфере, и для каждого куска выдаётся массив предсказаний.
+        """
+        buffer = None
+        filled = 0
+        for batch in batches:
+            batch = np.asarray(batch, dtype=self.dtype)
+            if batch.ndim == 1:
+                batch = batch[np.newaxis, :]
+            if buffer is None:
+                buffer = np.empty((chunk_size,) + batch.shape[1:], dtype=self.dtype)
+            
+            pos = 0
+            while pos < batch.shape[0]:
+                n_copy = min(chunk_size - filled, batch.shape[0] - pos)
+                buffer[filled:filled + n_copy] = batch[pos:pos + n_copy]
+                filled += n_copy
+                pos += n_copy
+                if filled == chunk_size:
+                    yield self._infer(buffer, np.empty((chunk_size, self._n_outputs()),
+                                                       dtype=self.dtype))
+                    filled = 0
+        
+        if filled:
+            yield self._infer(buffer[:filled], np.empty((filled, self._n_outputs()),
+                                                        dtype=self.dtype))
+    
+    def save(self, path):
+        """
+        Сохранение модели в бинарный файл
+        
+        Формат: MODEL_MAGIC, длина JSON-заголовка (uint64), заголовок
+        с конфигурацией и таблицей массивов, затем сами массивы,
+        выровненные по MODEL_ALIGNMENT байт, - их можно отобразить
+        в память без копирования (см. load).
+        """
+        arrays = {
+            "params": self.params,
+            "loss_history": np.asarray(self.loss_history, dtype=np.float64),
+            "val_loss_history": np.asarray(self.val_loss_history, dtype=np.float64),
+        }
+        optimizer_hyper = {}
+        for name, value in vars(self.optimizer).items():
+            if name.startswith("_") or value is None:
+                continue
+            if isinstance(value, np.ndarray):
+                arrays["optimizer." + name] = value
+            else:
+                optimizer_hyper[name] = value
+        
+        header = {
+            "class": type(self).__name__,
+            "config": self._config,
+            "learning_rate": self.learning_rate,
+            "optimizer": {"class": type(self.optimizer).__name__, "hyper": optimizer_hyper},
+            "arrays": {},
+        }
+        # Смещения массивов зависят от длины заголовка, поэтому заголовок
+        # сериализуется с запасом под смещения и дополняется пробелами
+        for name, arr in arrays.items():
+            header["arrays"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape),
+                                      "offset": 0}
+        header_size = len(json.dumps(header).encode()) + 32 * len(arrays)
+        data_start = _align(len(MODEL_MAGIC) + 8 + header_size)
+        offset = data_start
+        for name, arr in arrays.items():
+            header["arrays"][name]["offset"] = offset
+            offset = _align(offset + arr.nbytes)
+        header_bytes = json.dumps(header).encode().ljust(header_size)
+        
+        with open(path, "wb") as f:
+            f.write(MODEL_MAGIC)
+            f.write(struct.pack("<Q", header_size))
+            f.write(header_bytes)
+            for name, arr in arrays.items():
+                f.seek(header["arrays"][name]["offset"])
+                np.ascontiguousarray(arr).tofile(f)
+    
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Загрузка модели, сохранённой методом save
+        
+        mmap_mode: None - массивы читаются в память;
+                   "r" - параметры отображаются в память только для чтения
+                         (несколько процессов делят одну копию весов,
+                         обучение такой модели невозможно);
+                   "c" - копирование при записи (можно дообучать,
+                         файл при этом не меняется)
+        """
+        with open(path, "rb") as f:
+            if f.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+                raise ValueError(f"{path}: не файл модели SimpleNeuralNetwork")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size).decode())
+        
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            shape = tuple(spec["shape"])
+            if mmap_mode is None or int(np.prod(shape)) == 0:
+                arrays[name] = np.fromfile(path, dtype=spec["dtype"], count=int(np.prod(shape)),
+                                           offset=spec["offset"]).reshape(shape)
+            else:
+                arrays[name] = np.memmap(path, dtype=spec["dtype"], mode=mmap_mode,
+                                         offset=spec["offset"], shape=shape)
+        
+        model_cls = {c.__name__: c for c in (cls, SimpleNeuralNetwork, DeepNeuralNetwork)}[header["class"]]
+        optimizer = OPTIMIZER_CLASSES[header["optimizer"]["class"]]()
+        for name, value in header["optimizer"]["hyper"].items():
+            setattr(optimizer, name, value)
+        for name, arr in arrays.items():
+            if name.startswith("optimizer."):
+                # Состояние оптимизатора всегда копируется - оно меняется при дообучении
+                setattr(optimizer, name[len("optimizer."):], np.array(arr))
+        
+        model = model_cls(learning_rate=header["learning_rate"], optimizer=optimizer,
+                          params=arrays["params"], **header["config"])
+        model.loss_history = np.array(arrays["loss_history"])
+        model.val_loss_history = np.array(arrays["val_loss_history"])
+        return model
+
+
+class DeepNeuralNetwork(SimpleNeuralNetwork):
+    def __init__(self, layer_sizes=(1, 16, 16, 1), activations=None, learning_rate=0.01,
+                 seed=None, optimizer="sgd", dtype=np.float64, params=None):
+        """
+        Полносвязная сеть произвольной глубины
+        
+        Параметры:
+        layer_sizes: размеры слоёв от входного до выходного, например (1, 64, 64, 1)
+        activations: имена активаций для каждого слоя (ключи ACTIVATIONS);
+                     по умолчанию ReLU на скрытых слоях и линейный выход
+        learning_rate: скорость обучения
+        seed: зерно генератора для инициализации весов и перемешивания
+        optimizer: "sgd", "momentum", "rmsprop", "adam" или объект с методом step
+        dtype: тип вычислений (np.float32 вдвое сокращает трафик памяти)
+        params: готовый плоский буфер параметров (веса тогда не инициализируются)
+        
+        Все веса и смещения хранятся в одном плоском буфере self.params,
+        self.weights/self.biases - его представления по слоям, поэтому
+        обновление параметров - одна векторная операция.
+        """
+        n_layers = len(layer_sizes) - 1
+        if n_layers < 1:
+            raise ValueError("Нужно хотя бы два размера слоя: входной и выходной")
+        if activations is None:
+            activations = ["relu"] * (n_layers - 1) + ["linear"]
+        if len(activations) != n_layers:
+            raise ValueError(f"Ожидалось {n_layers} активаций, получено {len(activations)}")
+        
+        self.dtype = np.dtype(dtype)
+        self._rng = np.random if seed is None else np.random.RandomState(seed)
+        self.layer_sizes = tuple(layer_sizes)
+        self.activations = list(activations)
+        self._activation_fns = [ACTIVATIONS[name] for name in self.activations]
+        self._config = {"layer_sizes": list(self.layer_sizes),
+                        "activations": self.activations, "dtype": self.dtype.name}
+        
+        self._shapes = []
+        for n_in, n_out in zip(layer_sizes[:-1], layer_sizes[1:]):
+            self._shapes += [(n_in, n_out), (1, n_out)]
+        n_params = sum(int(np.prod(shape)) for shape in self._shapes)
+        if params is None:
+            self.params = np.zeros(n_params, dtype=self.dtype)
+        else:
+            self.params = _check_params(params, n_params, self.dtype)
+        views = _flat_views(self.params, self._shapes)
+        self.weights = views[0::2]
+        self.biases = views[1::2]
+        
+        # Инициализация весов (He для ReLU, Xavier для остальных)
+        for W, name in zip(self.weights if params is None else [], self.activations):
+            scale = np.sqrt((2.0 if name == "relu" else 1.0) / W.shape[0])
+            W[...] = self._rng.randn(*W.shape) * scale
+        
+        self.learning_rate = learning_rate
+        self.optimizer = make_optimizer(optimizer)
+        self.loss_history = np.empty(0)
+        self.val_loss_history = np.empty(0)
+        
+        self.use_workspace = True
+        self._workspace = None
+    
+    def _get_workspace(self, m):
+        """Буферы активаций, их градиентов и градиентов параметров по слоям"""
+        ws = self._workspace
+        if ws is None or ws["capacity"] < m:
+            dtype = self.dtype
+            sizes = self.layer_sizes[1:]
+            grads = np.empty_like(self.params)
+            ws = {
+                "capacity": m,
+                "Z": [np.empty((m, n), dtype=dtype) for n in sizes],
+                "A": [np.empty((m, n), dtype=dtype) for n in sizes],
+                "dZ": [np.empty((m, n), dtype=dtype) for n in sizes],
+                "buf": [np.empty((m, n), dtype=dtype) for n in sizes],
+                "grads": grads,
+                "grad_views": tuple(_flat_views(grads, self._shapes)),
+            }
+            self._workspace = ws
+        return ws
+    
+    def forward(self, X):
+        """
+        Прямой проход через все слои
+        
+        Результат - представление внутреннего буфера, которое
+        перезаписывается следующим вызовом forward.
+        """
+        m = X.shape[0]
+        ws = self._get_workspace(m)
+        a = X
+        for W, b, (act_forward, _), Z, A in zip(self.weights, self.biases,
+                                                self._activation_fns, ws["Z"], ws["A"]):
+            z = Z[:m]
+            np.dot(a, W, out=z)
+            z += b
+            act_forward(z, A[:m])
+            a = A[:m]
+        return a
+    
+    def compute_loss(self, y_pred, y_true):
+        """Среднеквадратичная ошибка"""
+        m = y_pred.shape[0]
+        diff = self._get_workspace(m)["dZ"][-1][:m]
+        np.subtract(y_pred, y_true, out=diff)
+        flat = diff.reshape(-1)
+        return float(np.dot(flat, flat)) / flat.size
+    
+    def backward(self, X, y_true, y_pred):
+        """
+        Обратное распространение ошибки
+        
+        Возвращает градиенты (dW1, db1, dW2, db2, ...) - представления
+        плоского буфера градиентов той же раскладки, что и self.params.
+        """
+        m = X.shape[0]
+        ws = self._get_workspace(m)
+        grad_views = ws["grad_views"]
+        n_layers = len(self.weights)
+        
+        dz = ws["dZ"][-1][:m]
+        np.subtract(y_pred, y_true, out=dz)
+        dz *= 2.0 / m
+        
+        for i in range(n_layers - 1, -1, -1):
+            _, act_backward = self._activation_fns[i]
+            act_backward(dz, ws["Z"][i][:m], ws["A"][i][:m], ws["buf"][i][:m])
+            
+            a_prev = X if i == 0 else ws["A"][i - 1][:m]
+            np.dot(a_prev.T, dz, out=grad_views[2 * i])
+            np.sum(dz, axis=0, keepdims=True, out=grad_views[2 * i + 1])
+            
+            if i > 0:
+                dz_prev = ws["dZ"][i - 1][:m]
+                np.dot(dz, self.weights[i].T, out=dz_prev)
+                dz = dz_prev
+        
+        return grad_views
+    
+    def update_parameters(self, *grads):
+        """Обновление всех параметров одной операцией над плоским буфером"""
+        ws = self._get_workspace(0)
+        grad_views = ws["grad_views"]
+        if len(grads) != len(grad_views):
+            raise ValueError(f"Ожидалось {len(grad_views)} градиентов, получено {len(grads)}")
+        for grad, view in zip(grads, grad_views):
+            if grad is not view:
+                view[...] = grad
+        self.optimizer.step(self.params, ws["grads"], self.learning_rate)
+    
+    def _n_outputs(self):
+        """Количество выходных нейронов"""
+        return self.layer_sizes[-1]
+    
+    def _infer(self, X, out):
+        """Прямой проход только для инференса, без изменения состояния модели"""
+        a = X
+        n_layers = len(self.weights)
+        for i, (W, b, (act_forward, _)) in enumerate(zip(self.weights, self.biases,
+                                                         self._activation_fns)):
+            z = out if i == n_layers - 1 else np.empty((X.shape[0], W.shape[1]), dtype=self.dtype)
+            np.dot(a, W, out=z)
+            z += b
+            act_forward(z, z)
+            a = z
+        return out
+
+# Состояние процесса-воркера data-parallel обучения (см. SimpleNeuralNetwork.train)
+_PARALLEL_WORKER = {}
+
+
+def _parallel_worker_init(class_name, config, specs):
+    """Подключение воркера к разделяемой памяти и создание локальной копии модели"""
+    for name, (shm_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        _PARALLEL_WORKER[name + "_block"] = block
+        _PARALLEL_WORKER[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    
+    # Модель воркера работает прямо на разделяемом буфере параметров
+    model_cls = {"SimpleNeuralNetwork": SimpleNeuralNetwork,
+                 "DeepNeuralNetwork": DeepNeuralNetwork}[class_name]
+    _PARALLEL_WORKER["model"] = model_cls(params=_PARALLEL_WORKER["params"], **config)
+
+
+def _parallel_shard_step(row, lo, hi):
+    """
+    Градиент по шарду order[lo:hi] пишется в строку row матрицы градиентов
+    
+    Возвращает сумму квадратов ошибок по шарду (loss * m).
+    """
+    state = _PARALLEL_WORKER
+    model = state["model"]
+    idx = state["order"][lo:hi]
+    Xb = np.take(state["X"], idx, axis=0)
+    yb = np.take(state["y"], idx, axis=0)
+    
+    y_pred = model.forward(Xb)
+    loss = model.compute_loss(y_pred, yb)
+    model.backward(Xb, yb, y_pred)
+    np.copyto(state["grads"][row], model._get_workspace(0)["grads"])
+    return loss * (hi - lo)
+
 
 # Пример использования для нелинейной задачи
-def generate_nonlinear_data(n_samples=200):
-    """Генерация нелинейных данных"""
+def generate_nonlinear_data(n_samples=200, dtype=np.float64):
+    """Генерация нелинейных данных (dtype - тип возвращаемых массивов)"""
     np.random.seed(42)
     X = np.random.randn(n_samples, 1) * 2
     y = np.sin(X * 2) + 0.5 * X + np.random.randn(n_samples, 1) * 0.1
-    return X, y
+    return X.astype(dtype, copy=False), y.astype(dtype, copy=False)
 
-def main():
-    # Генерация данных
-    X, y = generate_nonlinear_data(300)
+def benchmark_workspace(n_samples=20000, hidden_size=64, epochs=20, batch_size=None):
+    """
+    Сравнение обучения с буферами workspace и без них
     
-    # Создание нейронной сети
-    nn = SimpleNeuralNetwork(
-        input_size=1,
-        hidden_size=10,  # 10 нейронов в скрытом слое
-        output_size=1,
-        learning_rate=0.01
-    )
+    Для каждого режима печатает среднее время эпохи и пиковый объём
+    временной памяти, выделенной за одну эпоху (по tracemalloc, после
+    прогревочной эпохи).
+    """
+    X, y = generate_nonlinear_data(n_samples)
+    results = {}
     
-    print("Архитектура сети:")
-    print(f"Входной слой: {nn.W1.shape[0]} нейрон(ов)")
-    print(f"Скрытый слой: {nn.W1.shape[1]} нейронов")
-    print(f"Выходной слой: {nn.W2.shape[1]} нейрон(ов)")
-    print("\nНачало обучения...")
+    for use_workspace in (False, True):
+        nn = SimpleNeuralNetwork(1, hidden_size, 1, learning_rate=0.01,
+                                 seed=0, use_workspace=use_workspace)
+        # Прогрев: буферы workspace выделяются на первой эпохе
+        nn.train(X, y, epochs=1, verbose=False, batch_size=batch_size)
+        
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        nn.train(X, y, epochs=1, verbose=False, batch_size=batch_size)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        start = time.perf_counter()
+        nn.train(X, y, epochs=epochs, verbose=False, batch_size=batch_size)
+        epoch_time = (time.perf_counter() - start) / epochs
+        
+        mode = "workspace" if use_workspace else "allocating"
+        results[mode] = {"epoch_time_s": epoch_time, "peak_alloc_bytes": peak_bytes}
+        print(f"{mode:>10}: {epoch_time * 1000:.3f} мс/эпоха, "
+              f"пик временной памяти {peak_bytes / 1024:.1f} КиБ")
     
-    # Обучение
-    nn.train(X, y, epochs=2000, verbose=True)
+    return results
+
+# Сетка параметров бенчмарка по умолчанию (python 1.py --benchmark)
+BENCHMARK_GRID = {
+    "n_samples": (1000, 10000, 100000),
+    "hidden_size": (16, 128),
+    "batch_size": (None, 256),
+    "dtype": ("float64", "float32"),
+}
+
+
+def _timed(fn, totals, phase):
+    """Обёртка метода, накапливающая время вызовов в totals[phase]"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            totals[phase] += time.perf_counter() - start
+    return wrapper
+
+
+def benchmark_training(n_samples, hidden_size, batch_size, dtype, epochs=10):
+    """
+    Замер обучения SimpleNeuralNetwork для одной конфигурации
     
-    # Визуализация
-    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    Время считается после прогревочной эпохи (буферы уже выделены),
+    пиковая память - отдельным прогоном под tracemalloc, чтобы
+    трассировка не искажала время.
+    """
+    X, y = generate_nonlinear_data(n_samples, dtype=dtype)
+    nn = SimpleNeuralNetwork(1, hidden_size, 1, learning_rate=0.01, seed=0, dtype=dtype)
+    nn.train(X, y, epochs=1, verbose=False, batch_size=batch_size)
+    
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    nn.train(X, y, epochs=1, verbose=False, batch_size=batch_size)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    # Методы подменяются на экземпляре - train вызывает их через self
+    phases = {"forward": 0.0, "backward": 0.0, "update_parameters": 0.0}
+    for phase in phases:
+        setattr(nn, phase, _timed(getattr(nn, phase), phases, phase))
+    
+    start = time.perf_counter()
+    nn.train(X, y, epochs=epochs, verbose=False, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    
+    return {
+        "n_samples": n_samples,
+        "hidden_size": hidden_size,
+        "batch_size": batch_size,
+        "dtype": np.dtype(dtype).name,
+        "epochs": epochs,
+        "epochs_per_sec": epochs / elapsed,
+        "samples_per_sec": epochs * n_samples / elapsed,
+        "peak_memory_bytes": peak_bytes,
+        "phase_time_s": {phase: total / epochs for phase, total in phases.items()},
+    }
+
+
+def run_benchmarks(output_path=None, grid=None, epochs=10, baseline_path=None,
+                   tolerance=0.2):
+    """
+    Прогон бенчмарка по сетке параметров без графики
+    
+    output_path: куда записать результаты в JSON
+    grid: словарь списков значений (по умолчанию BENCHMARK_GRID)
+    baseline_path: JSON предыдущего прогона - конфигурации, у которых
+                   epochs_per_sec упал больше чем на tolerance, выводятся
+                   как регрессии
+    Возвращает список регрессий (пустой, если их нет).
+    """
+    grid = {**BENCHMARK_GRID, **(grid or {})}
+    results = []
+    for n_samples, hidden_size, batch_size, dtype in itertools.product(
+            grid["n_samples"], grid["hidden_size"], grid["batch_size"], grid["dtype"]):
+        result = benchmark_training(n_samples, hidden_size, batch_size, dtype, epochs=epochs)
+        results.append(result)
+        phase = result["phase_time_s"]
+        print(f"n={n_samples:>7} hidden={hidden_size:>4} batch={str(batch_size):>5} "
+              f"{result['dtype']:>7}: {result['epochs_per_sec']:9.1f} эпох/с, "
+              f"{result['samples_per_sec']:12.0f} примеров/с, "
+              f"пик {result['peak_memory_bytes'] / 2 ** 20:7.2f} МиБ | "
+              f"forward {phase['forward'] * 1000:.2f} мс, "
+              f"backward {phase['backward'] * 1000:.2f} мс, "
+              f"update {phase['update_parameters'] * 1000:.2f} мс")
+    
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+    if output_path is not None:
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Результаты записаны в {output_path}")
+    
+    regressions = []
+    if baseline_path is not None:
+        with open(baseline_path) as f:
+            baseline = json.load(f)["results"]
+        key_fields = ("n_samples", "hidden_size", "batch_size", "dtype")
+        baseline_by_key = {tuple(r[k] for k in key_fields): r for r in baseline}
+        for result in results:
+            old = baseline_by_key.get(tuple(result[k] for k in key_fields))
+            if old and result["epochs_per_sec"] < old["epochs_per_sec"] * (1 - tolerance):
+                regressions.append({"config": {k: result[k] for k in key_fields},
+                                    "baseline_epochs_per_sec": old["epochs_per_sec"],
+                                    "epochs_per_sec": result["epochs_per_sec"]})
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ {regression['config']}: "
+                  f"{regression['baseline_epochs_per_sec']:.1f} -> "
+                  f"{regression['epochs_per_sec']:.1f} эпох/с")
+    return regressions
+
+# Параметры перебора, которые передаются в конструктор сети (остальные - в train)
+SWEEP_MODEL_KEYS = ("hidden_size", "learning_rate", "optimizer", "dtype")
+
+# Данные перебора в процессе-воркере (задаются один раз при старте пула)
+_SWEEP_DATA = {}
+
+
+def _sweep_worker_init(X, y, validation_split):
+    """Инициализация воркера перебора: данные передаются один раз на процесс"""
+    _SWEEP_DATA.update(X=X, y=y, validation_split=validation_split)
+
+
+def _run_sweep_trial(config, trial_seed):
+    """Обучение и оценка сети для одной конфигурации перебора"""
+    X, y = _SWEEP_DATA["X"], _SWEEP_DATA["y"]
+    n_val = max(1, int(X.shape[0] * _SWEEP_DATA["validation_split"]))
+    X_train, y_train = X[:-n_val], y[:-n_val]
+    X_val, y_val = X[-n_val:], y[-n_val:]
+    
+    model_kwargs = {k: v for k, v in config.items() if k in SWEEP_MODEL_KEYS}
+    train_kwargs = {k: v for k, v in config.items() if k not in SWEEP_MODEL_KEYS}
+    nn = SimpleNeuralNetwork(input_size=X.shape[1], output_size=y.shape[1],
+                             seed=trial_seed, **model_kwargs)
+    
+    start = time.perf_counter()
+    epochs_run = nn.train(X_train, y_train, verbose=False,
+                          validation_data=(X_val, y_val), **train_kwargs)
+    train_time = time.perf_counter() - start
+    
+    val_pred = nn.predict(X_val)
+    return {
+        **config,
+        "seed": trial_seed,
+        "train_loss": float(nn.loss_history[-1]),
+        "val_loss": float(np.mean((val_pred - np.asarray(y_val, dtype=nn.dtype)) ** 2)),
+        "epochs_run": epochs_run,
+        "train_time_s": train_time,
+    }
+
+
+def _hash_json(obj):
+    """Стабильный хэш JSON-сериализуемого объекта"""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hyperparameter_sweep(X, y, param_grid, n_random=None, n_workers=None,
+                         cache_dir=".sweep_cache", seed=0, validation_split=0.2):
+    """
+    Перебор гиперпараметров SimpleNeuralNetwork
+    
+    param_grid: словарь {параметр: список значений}; параметры из
+                SWEEP_MODEL_KEYS идут в конструктор, остальные
+                (epochs, batch_size, patience, ...) - в train
+    n_random: None - полный перебор сетки, иначе столько случайных
+              конфигураций из сетки (значение может быть и функцией
+              rng -> значение, например для лог-равномерного learning_rate)
+    n_workers: число процессов (None - все ядра)
+    cache_dir: каталог кэша; результат испытания хранится под ключом
+               из конфигурации и хэша данных, поэтому при повторном
+               запуске готовые испытания не пересчитываются (None - без кэша)
+    seed: базовое зерно; зерно испытания выводится из него и конфигурации
+    
+    Возвращает pandas.DataFrame с результатами, отсортированный по val_loss.
+    """
+    import pandas as pd
+    
+    X = np.ascontiguousarray(X)
+    y = np.ascontiguousarray(y)
+    data_hash = hashlib.sha256()
+    for arr in (X, y):
+        data_hash.update(str((arr.shape, arr.dtype.str)).encode())
+        data_hash.update(memoryview(arr).cast("B"))
+    data_hash = data_hash.hexdigest()
+    
+    names = list(param_grid)
+    if n_random is None:
+        configs = [dict(zip(names, values))
+                   for values in itertools.product(*(param_grid[name] for name in names))]
+    else:
+        rng = np.random.RandomState(seed)
+        configs = []
+        for _ in range(n_random):
+            config = {}
+            for name in names:
+                values = param_grid[name]
+                value = values(rng) if callable(values) else values[rng.randint(len(values))]
+                # Значения NumPy приводятся к обычным типам для JSON-ключа кэша
+                config[name] = value.item() if isinstance(value, np.generic) else value
+            configs.append(config)
+    
+    trials = []
+    for config in configs:
+        trial_seed = int(_hash_json([seed, config])[:8], 16) % 2 ** 31
+        key = _hash_json([config, trial_seed, validation_split, data_hash])
+        trials.append((config, trial_seed, key))
+    
+    results = {}
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for _, _, key in trials:
+            path = os.path.join(cache_dir, key + ".json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    results[key] = json.load(f)
+    
+    pending = [trial for trial in trials if trial[2] not in results]
+    if pending:
+        with multiprocessing.Pool(n_workers, initializer=_sweep_worker_init,
+                                  initargs=(X, y, validation_split)) as pool:
+            async_results = [(key, pool.apply_async(_run_sweep_trial, (config, trial_seed)))
+                             for config, trial_seed, key in pending]
+            for key, async_result in async_results:
+                results[key] = async_result.get()
+                if cache_dir is not None:
+                    # Запись через временный файл, чтобы прерванный запуск не оставил битый кэш
+                    path = os.path.join(cache_dir, key + ".json")
+                    with open(path + ".tmp", "w") as f:
+                        json.dump(results[key], f, default=str)
+                    os.replace(path + ".tmp", path)
+    
+    pending_keys = {key for _, _, key in pending}
+    df = pd.DataFrame([{**results[key], "cached": key not in pending_keys}
+                       for _, _, key in trials])
+    return df.sort_values("val_loss").reset_index(drop=True)
+
+def minmax_decimate(values, max_points):
+    """
+    Прореживание ряда до ~max_points точек с сохранением экстремумов
+    
+    Ряд делится не больше чем на max_points // 2 корзин одного размера,
+    из каждой берутся индексы минимума и максимума (в порядке следования),
+    поэтому выбросы и форма кривой сохраняются. Возвращает (индексы, значения).
+    """
+    values = np.asarray(values)
+    n = values.shape[0]
+    if n <= max_points:
+        return np.arange(n), values
+    
+    bin_size = -(-n // max(1, max_points // 2))
+    # Число корзин - по округлённому вверх размеру: дополнение меньше одной
+    # корзины, и в каждой корзине есть точки ряда
+    n_bins = -(-n // bin_size)
+    # Хвост дополняется последним значением, чтобы ряд лёг в матрицу корзин
+    padded = np.pad(values, (0, n_bins * bin_size - n), mode="edge").reshape(n_bins, bin_size)
+    bin_starts = np.arange(n_bins) * bin_size
+    idx = np.stack([padded.argmin(axis=1), padded.argmax(axis=1)], axis=1)
+    idx = np.sort(idx, axis=1) + bin_starts[:, np.newaxis]
+    idx = np.minimum(idx.ravel(), n - 1)
+    return idx, values[idx]
+
+
+def plot_training(nn, X, y, output_path=None, max_loss_points=2000, dpi=100):
+    """
+    Графики данных с предсказанием, ошибки обучения и активаций скрытого слоя
+    
+    output_path: путь к файлу изображения - рисование без окна (Agg),
+                 иначе окно matplotlib (plt.show)
+    max_loss_points: длинная история ошибки прореживается min/max-методом
+    """
+    from matplotlib.collections import LineCollection
+    
+    if output_path is not None:
+        # Фигура без pyplot: не нужен дисплей и не трогается глобальный backend
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
+        fig = Figure(figsize=(15, 4))
+        FigureCanvasAgg(fig)
+        axes = fig.subplots(1, 3)
+    else:
+        import matplotlib.pyplot as plt
+        
+        fig, axes = plt.subplots(1, 3, figsize=(15, 4))
     
     # 1. Данные и предсказания
     axes[0].scatter(X, y, alpha=0.5, s=10, label='Данные')
@@ -137,25 +1403,60 @@ def main():
     axes[0].grid(True, alpha=0.3)
     
     # 2. График потерь
-    axes[1].plot(nn.loss_history)
+    epochs_idx, losses = minmax_decimate(nn.loss_history, max_loss_points)
+    axes[1].plot(epochs_idx, losses)
     axes[1].set_xlabel('Эпоха')
     axes[1].set_ylabel('Потери (MSE)')
     axes[1].set_title('График обучения')
     axes[1].set_yscale('log')
     axes[1].grid(True, alpha=0.3)
     
-    # 3. Активации нейронов скрытого слоя
+    # 3. Активации нейронов скрытого слоя - все кривые одной LineCollection
     axes[2].set_title('Активации нейронов скрытого слоя')
-    z1 = np.dot(X_test, nn.W1) + nn.b1
-    for i in range(nn.W1.shape[1]):
-        activation = nn.relu(z1[:, i:i+1])
-        axes[2].plot(X_test, activation, alpha=0.7, label=f'Нейрон {i+1}')
+    activations = np.maximum(np.dot(X_test, nn.W1) + nn.b1, 0)
+    n_neurons = activations.shape[1]
+    segments = np.empty((n_neurons, X_test.shape[0], 2))
+    segments[:, :, 0] = X_test[:, 0]
+    segments[:, :, 1] = activations.T
+    colors = [f"C{i % 10}" for i in range(n_neurons)]
+    axes[2].add_collection(LineCollection(segments, colors=colors, alpha=0.7))
+    axes[2].autoscale_view()
     axes[2].set_xlabel('X')
     axes[2].set_ylabel('Активация')
     axes[2].grid(True, alpha=0.3)
     
-    plt.tight_layout()
-    plt.show()
+    fig.tight_layout()
+    if output_path is not None:
+        fig.savefig(output_path, dpi=dpi)
+    else:
+        plt.show()
+    return fig
+
+def main(plot_path=None):
+    """plot_path: сохранить графики в файл вместо показа окна"""
+    # Генерация данных
+    X, y = generate_nonlinear_data(300)
+    
+    # Создание нейронной сети
+    nn = SimpleNeuralNetwork(
+        input_size=1,
+        hidden_size=10,  # 10 нейронов в скрытом слое
+        output_size=1,
+        learning_rate=0.01,
+        optimizer="adam"
+    )
+    
+    print("Архитектура сети:")
+    print(f"Входной слой: {nn.W1.shape[0]} нейрон(ов)")
+    print(f"Скрытый слой: {nn.W1.shape[1]} нейронов")
+    print(f"Выходной слой: {nn.W2.shape[1]} нейрон(ов)")
+    print("\nНачало обучения...")
+    
+    # Обучение
+    nn.train(X, y, epochs=2000, verbose=True)
+    
+    # Визуализация
+    plot_training(nn, X, y, output_path=plot_path)
     
     print("\nПример предсказаний:")
     test_points = np.array([[-2], [0], [2]])
@@ -164,4 +1465,26 @@ def main():
         print(f"X = {x[0]:.1f}, Предсказание = {pred[0]:.3f}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Простая нейронная сеть на NumPy")
+    parser.add_argument("--benchmark-workspace", action="store_true",
+                        help="сравнить обучение с буферами workspace и без них")
+    parser.add_argument("--benchmark", metavar="RESULTS_JSON", nargs="?", const="",
+                        help="прогнать бенчмарк по BENCHMARK_GRID (и записать JSON)")
+    parser.add_argument("--baseline", metavar="BASELINE_JSON",
+                        help="сравнить бенчмарк с результатами предыдущего прогона")
+    parser.add_argument("--epochs", type=int, default=10, help="эпох на конфигурацию бенчмарка")
+    parser.add_argument("--plot-output", metavar="IMAGE",
+                        help="сохранить графики в файл без открытия окна")
+    args = parser.parse_args()
+    
+    if args.benchmark_workspace:
+        benchmark_workspace()
+    elif args.benchmark is not None:
+        regressions = run_benchmarks(args.benchmark or None, epochs=args.epochs,
+                                     baseline_path=args.baseline)
+        sys.exit(1 if regressions else 0)
+    else:
+        main(plot_path=args.plot_output)
\ No newline at end of file
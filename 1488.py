@@ -2,7 +2,35 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import csv
+import functools
+import importlib.util
+import io
+import itertools
+import json
+import multiprocessing
+import os
 import random
+import re
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import fight_simulator
+
+# Время начала перезапуска скрипта - для замера задержки в футере
+_rerun_started = time.perf_counter()
 
 # =================== КОНФИГУРАЦИЯ ===================
 st.set_page_config(page_title="Game Balance AI", layout="wide")
@@ -20,81 +48,1554 @@ WINRATES = {
     "Pudge": 51.2
 }
 
+# Статические характеристики для каждого героя
+HERO_STATS = {
+    "Axe": {
+        "Здоровье": 720,
+        "Броня": 4.5,
+        "Урон": 75,
+        "Скорость атаки": 100,
+        "Мана": 150
+    },
+    "Джаггернаут": {
+        "Здоровье": 680,
+        "Броня": 2.0,
+        "Урон": 95,
+        "Скорость атаки": 140,
+        "Мана": 120
+    },
+    "Invoker": {
+        "Здоровье": 620,
+        "Броня": 0.5,
+        "Урон": 55,
+        "Скорость атаки": 80,
+        "Мана": 350
+    },
+    "Cristal maiden": {
+        "Здоровье": 600,
+        "Броня": 1.0,
+        "Урон": 50,
+        "Скорость атаки": 70,
+        "Мана": 300
+    },
+    "Pudge": {
+        "Здоровье": 800,
+        "Броня": 3.0,
+        "Урон": 85,
+        "Скорость атаки": 90,
+        "Мана": 180
+    }
+}
+
+# Идентификаторы героев в OpenDota
+HERO_IDS = {
+    "Axe": 2,
+    "Джаггернаут": 8,
+    "Invoker": 74,
+    "Cristal maiden": 5,
+    "Pudge": 14
+}
+# Верхняя граница id героя (с запасом над текущим ростером ~125 героев)
+MAX_HERO_ID = 160
+
+OPENDOTA_URL = "https://api.opendota.com/api"
+# Размер пачки матчей при разборе (страница /publicMatches - 100 матчей)
+ETL_BATCH_SIZE = 100
+# Строк CSV в одном куске при разборе загруженного файла
+CSV_CHUNK_ROWS = 200_000
+
+# Колоночное хранилище агрегатов героев: Parquet-датасет с разделами patch=<патч>
+HERO_STORE_DIR = Path(__file__).resolve().parent / "data" / "hero_stats"
+# Матрицы пар героев (противостояния и союзы): по файлу <патч>.npz на патч
+HERO_PAIRS_DIR = Path(__file__).resolve().parent / "data" / "hero_pairs"
+HERO_STORE_PARTITIONING = ds.partitioning(pa.schema([("patch", pa.string())]), flavor="hive")
+CURRENT_PATCH = "7.37"
+# Допустимое имя патча: из него строятся имена файлов и разделов хранилища
+PATCH_PATTERN = re.compile(r"\d+\.\d+[a-z]?")
+DEMO_DATA_LABEL = "Демо-данные"
+
+# Зерно демо-частот выбора (чтобы они не менялись при каждом перезапуске скрипта)
+PICKRATE_SEED = 1488
+
+# =================== КЭШИРУЕМЫЕ ДАННЫЕ ===================
+# Streamlit перезапускает скрипт целиком при любом действии пользователя,
+# поэтому производные таблицы и графики строятся один раз на набор входов.
+# cache_resource - только для графиков с конечным набором входов (герой, патч);
+# графики, зависящие от слайдеров, - в cache_data с ограничением записей.
+
+# Записей в кэше графиков, ключ которых зависит от слайдеров
+FIGURE_CACHE_ENTRIES = 16
+
+@st.cache_data
+def get_pickrates(heroes, seed=PICKRATE_SEED):
+    """Демо-частоты выбора героев"""
+    rng = random.Random(seed)
+    return {hero: rng.randint(5, 30) for hero in heroes}
+
+
+@st.cache_data
+def build_dashboard_frames(winrates, pickrates):
+    """Таблицы винрейта (отсортированная) и частоты выбора для дашборда"""
+    df_winrate = pd.DataFrame(list(winrates.items()), columns=["Герой", "Винрейт (%)"])
+    df_winrate = df_winrate.sort_values(by="Винрейт (%)", ascending=False)
+    df_pickrate = pd.DataFrame(list(pickrates.items()), columns=["Герой", "Частота выбора (%)"])
+    return df_winrate, df_pickrate
+
+
+@st.cache_resource
+def build_dashboard_figures(winrates, pickrates):
+    """Графики дашборда: винрейт по героям и популярность"""
+    df_winrate, df_pickrate = build_dashboard_frames(winrates, pickrates)
+    fig_winrate = px.bar(df_winrate, x="Герой", y="Винрейт (%)", color="Винрейт (%)")
+    fig_pickrate = px.pie(df_pickrate, names="Герой", values="Частота выбора (%)")
+    return fig_winrate, fig_pickrate
+
+
+@st.cache_data
+def get_role_weights(hero):
+    """Веса влияния параметров на винрейт (зависят от роли героя)"""
+    if hero == "Axe" or hero == "Pudge":
+        # Танки/иницииаторы
+        return {"Здоровье": 0.35, "Броня": 0.3, "Урон": 0.15, "Скорость атаки": 0.1, "Мана": 0.1}
+    elif hero == "Джаггернаут":
+        # Керри/урон
+        return {"Здоровье": 0.2, "Броня": 0.15, "Урон": 0.35, "Скорость атаки": 0.2, "Мана": 0.1}
+    elif hero == "Invoker" or hero == "Cristal maiden":
+        # Маги/саппорты
+        return {"Здоровье": 0.25, "Броня": 0.2, "Урон": 0.1, "Скорость атаки": 0.1, "Мана": 0.35}
+    else:
+        return {"Здоровье": 0.25, "Броня": 0.25, "Урон": 0.2, "Скорость атаки": 0.2, "Мана": 0.1}
+
+
+@st.cache_resource
+def build_importance_figure(hero):
+    """График весов параметров для героя"""
+    df_importance = pd.DataFrame(list(get_role_weights(hero).items()),
+                                 columns=["Параметр", "Вес влияния"])
+    return px.bar(df_importance.sort_values(by="Вес влияния"),
+                  x="Вес влияния", y="Параметр",
+                  orientation='h', color="Вес влияния",
+                  color_continuous_scale="Viridis")
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES)
+def build_comparison_figure(hero, params_names, old_values, new_values):
+    """Сравнение текущих и предлагаемых параметров героя"""
+    fig_comparison = go.Figure(data=[
+        go.Bar(name='Текущие', x=list(params_names), y=list(old_values), marker_color='lightblue'),
+        go.Bar(name='Предлагаемые', x=list(params_names), y=list(new_values), marker_color='lightgreen')
+    ])
+    
+    fig_comparison.update_layout(
+        barmode='group',
+        title=f"Сравнение параметров героя {hero}",
+        xaxis_title="Параметры",
+        yaxis_title="Значение",
+        showlegend=True
+    )
+    return fig_comparison
+
+# =================== МОДЕЛЬ ВЛИЯНИЯ ИЗМЕНЕНИЙ ===================
+# Векторизованная эвристика влияния изменения параметров на винрейт.
+# Все функции принимают массивы, совместимые по broadcasting: последняя ось -
+# параметры в порядке IMPACT_PARAMS, перед ней - герои, ещё раньше - сценарии.
+
+IMPACT_PARAMS = ["Здоровье", "Броня", "Урон", "Скорость атаки", "Мана"]
+# Броня меняется в абсолютных единицах, остальные параметры - в процентах
+ABSOLUTE_PARAMS = np.array([name == "Броня" for name in IMPACT_PARAMS])
+# Множители влияния изменения параметра (броня: 10 * 0.25 за единицу)
+IMPACT_COEFS = np.array([0.3, 10 * 0.25, 0.4, 0.35, 0.2])
+# Пересчёт изменения в «проценты» для оценки риска (единица брони ~ 5%)
+RISK_SCALE = np.array([1.0, 5.0, 1.0, 1.0, 1.0])
+
+MAX_IMPACT = 15
+WINRATE_RANGE = (30, 70)
+
+RISK_BINS = [15, 25]
+RISK_LABELS = ("🟢 Низкий", "🟡 Средний", "🔴 Высокий")
+COMPLEXITY_BINS = [10, 20]
+COMPLEXITY_LABELS = ("Простая", "Средняя", "Сложная")
+EFFICIENCY_BINS = [0.4, 0.8]
+EFFICIENCY_LABELS = ("Низкая", "Средняя", "Высокая")
+
+# Ограничение размера сетки сценариев массового анализа
+MAX_SCENARIOS = 100_000
+# Записей в кэше у функций, ключ которых зависит от слайдеров и сеток сценариев
+# (иначе каждая новая комбинация остаётся в памяти сервера навсегда)
+SCENARIO_CACHE_ENTRIES = 8
+
+# Диапазоны слайдеров вкладки балансировки: (минимум, максимум, шаг)
+SLIDER_RANGES = {
+    "Здоровье": (300, 1200, 10),
+    "Броня": (-5.0, 20.0, 0.5),
+    "Урон": (30, 200, 5),
+    "Скорость атаки": (20, 300, 5),
+    "Мана": (50, 500, 10),
+}
+# Суффиксы ключей слайдеров (slider_<суффикс>_<герой>)
+SLIDER_KEYS = {
+    "Здоровье": "hp",
+    "Броня": "armor",
+    "Урон": "damage",
+    "Скорость атаки": "attack_speed",
+    "Мана": "mana",
+}
+
+
+def hero_param_matrix(heroes, hero_stats=HERO_STATS):
+    """Текущие параметры героев: матрица (герои, параметры)"""
+    return np.array([[hero_stats[hero][name] for name in IMPACT_PARAMS] for hero in heroes],
+                    dtype=np.float64)
+
+
+def role_weight_matrix(heroes):
+    """Веса ролей героев: матрица (герои, параметры)"""
+    return np.array([[get_role_weights(hero)[name] for name in IMPACT_PARAMS] for hero in heroes],
+                    dtype=np.float64)
+
+
+def param_changes(current, proposed):
+    """Изменения параметров: % для относительных, абсолютные единицы для брони"""
+    current = np.asarray(current, dtype=np.float64)
+    proposed = np.asarray(proposed, dtype=np.float64)
+    return np.where(ABSOLUTE_PARAMS, proposed - current, (proposed / current - 1) * 100)
+
+
+def apply_changes(current, changes):
+    """Обратное к param_changes: параметры после применения изменений"""
+    current = np.asarray(current, dtype=np.float64)
+    changes = np.asarray(changes, dtype=np.float64)
+    return np.where(ABSOLUTE_PARAMS, current + changes, current * (1 + changes / 100))
+
+
+def evaluate_impact(current, proposed, weights, winrates, predictor=None):
+    """
+    Оценка влияния изменений для любого числа сценариев и героев сразу.
+
+    current, proposed и weights - массивы (..., параметры), winrates - (...).
+    predictor: функция (current, proposed) -> изменение винрейта в процентах
+               (обученная модель); None - эвристика с весами ролей.
+    Возвращает словарь массивов формы broadcast(...): изменения параметров,
+    delta и новый винрейт, максимальное изменение и коды уровней риска,
+    сложности и эффективности (индексы в *_LABELS).
+    """
+    changes = param_changes(current, proposed)
+    if predictor is None:
+        total_impact = (changes * np.asarray(weights) * IMPACT_COEFS).sum(axis=-1)
+    else:
+        total_impact = predictor(current, proposed)
+
+    delta = np.clip(total_impact, -MAX_IMPACT, MAX_IMPACT)
+    new_winrate = np.clip(np.asarray(winrates) + delta, *WINRATE_RANGE)
+
+    max_change = np.abs(changes * RISK_SCALE).max(axis=-1)
+    efficiency_score = np.abs(delta) / np.maximum(1, max_change) * 10
+
+    return {
+        "changes": changes,
+        "delta": delta,
+        "new_winrate": new_winrate,
+        "max_change": max_change,
+        "risk": np.digitize(max_change, RISK_BINS, right=True),
+        "complexity": np.digitize(max_change, COMPLEXITY_BINS),
+        "efficiency_score": efficiency_score,
+        "efficiency": np.digitize(efficiency_score, EFFICIENCY_BINS, right=True),
+    }
+
+
+def build_scenario_grid(axes):
+    """Декартова сетка изменений: axes - {параметр: значения}, результат (сценарии, параметры)"""
+    values = [np.asarray(axes.get(name, [0.0]), dtype=np.float64) for name in IMPACT_PARAMS]
+    mesh = np.meshgrid(*values, indexing="ij")
+    return np.stack([m.ravel() for m in mesh], axis=-1)
+
+
+@st.cache_data(max_entries=SCENARIO_CACHE_ENTRIES)
+def run_bulk_scenarios(heroes, axes, winrates, model_name=None, patch=None):
+    """
+    Оценка сетки сценариев для всех героев
+    
+    Массивы результатов (сценарии, герои) на больших сетках занимают десятки
+    МиБ, поэтому в кэш попадают только сводка и лучшие сценарии каждого героя
+    для каждого допустимого уровня риска.
+    Возвращает (сводка, {(индекс героя, допустимый риск): таблица сценариев}).
+    """
+    changes = build_scenario_grid(axes)
+    current = hero_param_matrix(heroes)
+    proposed = apply_changes(current, changes[:, None, :])
+    winrates = np.array([winrates[hero] for hero in heroes], dtype=np.float64)
+    result = evaluate_impact(current, proposed, role_weight_matrix(heroes), winrates,
+                             get_impact_predictor(model_name, patch))
+    top_frames = {(hero_index, max_risk): top_scenarios_frame(changes, result, hero_index,
+                                                              max_risk=max_risk)
+                  for hero_index in range(len(heroes)) for max_risk in range(len(RISK_LABELS))}
+    return bulk_summary_frame(heroes, result), top_frames
+
+
+def bulk_summary_frame(heroes, result):
+    """Сводка массового анализа по героям"""
+    risk = result["risk"]
+    return pd.DataFrame({
+        "Герой": heroes,
+        "Мин. delta (%)": result["delta"].min(axis=0).round(2),
+        "Макс. delta (%)": result["delta"].max(axis=0).round(2),
+        "Низкий риск (%)": ((risk == 0).mean(axis=0) * 100).round(1),
+        "Высокий риск (%)": ((risk == 2).mean(axis=0) * 100).round(1),
+        "Высокая эффективность (%)": ((result["efficiency"] == 2).mean(axis=0) * 100).round(1),
+    })
+
+
+def top_scenarios_frame(changes, result, hero_index, top_n=20, max_risk=2):
+    """Лучшие по эффективности сценарии для одного героя"""
+    risk = result["risk"][:, hero_index]
+    candidates = np.flatnonzero(risk <= max_risk)
+    score = result["efficiency_score"][candidates, hero_index]
+    # argpartition - O(n) отбор top_n без полной сортировки всей сетки
+    if len(candidates) > top_n:
+        part = np.argpartition(-score, top_n)[:top_n]
+        candidates, score = candidates[part], score[part]
+    order = candidates[np.argsort(-score, kind="stable")]
+
+    frame = pd.DataFrame(changes[order], columns=[
+        f"{name} ({'ед.' if absolute else '%'})"
+        for name, absolute in zip(IMPACT_PARAMS, ABSOLUTE_PARAMS)
+    ])
+    frame["Delta (%)"] = result["delta"][order, hero_index].round(2)
+    frame["Новый винрейт (%)"] = result["new_winrate"][order, hero_index].round(1)
+    frame["Риск"] = np.array(RISK_LABELS)[risk[order]]
+    frame["Эффективность"] = np.array(EFFICIENCY_LABELS)[result["efficiency"][order, hero_index]]
+    return frame
+
+
+def slider_values(name):
+    """Все значения слайдера параметра (концы диапазона включительно)"""
+    low, high, step = SLIDER_RANGES[name]
+    return low + step * np.arange(round((high - low) / step) + 1)
+
+
+@st.cache_data(max_entries=SCENARIO_CACHE_ENTRIES)
+def sensitivity_grid(hero, x_param, y_param, base_params, winrate, model_name=None, patch=None):
+    """Прогноз винрейта на сетке значений двух параметров (остальные - из base_params)"""
+    x_values, y_values = slider_values(x_param), slider_values(y_param)
+    proposed = np.tile(np.array([base_params[name] for name in IMPACT_PARAMS], dtype=np.float64),
+                       (len(y_values), len(x_values), 1))
+    proposed[..., IMPACT_PARAMS.index(x_param)] = x_values[None, :]
+    proposed[..., IMPACT_PARAMS.index(y_param)] = y_values[:, None]
+    result = evaluate_impact(hero_param_matrix([hero])[0], proposed,
+                             role_weight_matrix([hero])[0], winrate,
+                             get_impact_predictor(model_name, patch))
+    return x_values, y_values, result["new_winrate"]
+
+
+@st.cache_data(max_entries=FIGURE_CACHE_ENTRIES)
+def build_sensitivity_figure(hero, x_param, y_param, base_params, winrate,
+                             model_name=None, patch=None):
+    """Тепловая карта прогнозируемого винрейта по двум параметрам"""
+    x_values, y_values, grid = sensitivity_grid(hero, x_param, y_param, base_params, winrate,
+                                                model_name, patch)
+    fig = px.imshow(grid, x=x_values, y=y_values, origin="lower", aspect="auto",
+                    color_continuous_scale="RdYlGn_r", color_continuous_midpoint=50,
+                    labels={"x": x_param, "y": y_param, "color": "Винрейт (%)"})
+    current = HERO_STATS[hero]
+    fig.add_scatter(x=[current[x_param]], y=[current[y_param]], mode="markers",
+                    marker=dict(symbol="x", size=12, color="black"), name="Текущие")
+    fig.update_layout(title=f"Чувствительность винрейта героя {hero}")
+    return fig
+
+
+def candidate_changes(current, max_params=2):
+    """
+    Кандидаты для автоподбора: все значения слайдеров для каждого параметра
+    по отдельности и для каждой пары параметров (остальные - текущие).
+    Возвращает матрицу (кандидаты, параметры).
+    """
+    # Текущие значения из осей исключены, чтобы кандидаты не повторялись
+    blocks = [current[None, :]]
+    for n_params in range(1, max_params + 1):
+        for names in itertools.combinations(IMPACT_PARAMS, n_params):
+            axes = []
+            for name in names:
+                values = slider_values(name)
+                axes.append(values[values != current[IMPACT_PARAMS.index(name)]])
+            mesh = np.meshgrid(*axes, indexing="ij")
+            block = np.tile(current, (mesh[0].size, 1))
+            for name, values in zip(names, mesh):
+                block[:, IMPACT_PARAMS.index(name)] = values.ravel()
+            blocks.append(block)
+    return np.concatenate(blocks)
+
+
+@st.cache_data(max_entries=SCENARIO_CACHE_ENTRIES)
+def find_minimal_changes(hero, target_winrate, tolerance, winrate, model_name=None, patch=None,
+                         top_n=10):
+    """
+    Минимальные изменения параметров героя, дающие винрейт target ± tolerance.
+
+    Перебирает одиночные и парные изменения по сеткам слайдеров; стоимость -
+    сумма модулей изменений в процентах (единица брони ~ 5%, как при оценке
+    риска). Среди подходящих кандидатов выбираются самые дешёвые (при
+    равенстве - ближе к цели).
+    """
+    current = hero_param_matrix([hero])[0]
+    proposed = candidate_changes(current)
+    result = evaluate_impact(current, proposed, role_weight_matrix([hero])[0], winrate,
+                             get_impact_predictor(model_name, patch))
+
+    cost = np.abs(result["changes"] * RISK_SCALE).sum(axis=-1)
+    miss = np.abs(result["new_winrate"] - target_winrate)
+    found = np.flatnonzero(miss <= tolerance)
+    order = found[np.lexsort((miss[found], cost[found]))][:top_n]
+
+    frame = pd.DataFrame(proposed[order], columns=IMPACT_PARAMS)
+    frame["Суммарное изменение (%)"] = cost[order].round(1)
+    frame["Новый винрейт (%)"] = result["new_winrate"][order].round(2)
+    frame["Риск"] = np.array(RISK_LABELS)[result["risk"][order]]
+    return frame, len(proposed)
+
+
+def apply_proposal_to_sliders(hero, proposal):
+    """Перенос предложенных параметров в слайдеры (вызывается как on_click)"""
+    for name, value in proposal.items():
+        st.session_state[f"slider_{SLIDER_KEYS[name]}_{hero}"] = type(SLIDER_RANGES[name][0])(value)
+
+
+# =================== ОБУЧЕННАЯ МОДЕЛЬ ВИНРЕЙТА ===================
+# Альтернатива эвристике: сеть SimpleNeuralNetwork из 1.py, обученная на
+# параметрах героев и их винрейтах (демо-данные или агрегаты патча).
+
+NN_MODULE_PATH = Path(__file__).resolve().parent / "1.py"
+IMPACT_MODELS = ["Эвристика", "Обученная модель"]
+WINRATE_MODEL_EPOCHS = 3000
+
+
+@st.cache_resource
+def load_nn_module(path=NN_MODULE_PATH):
+    """Загрузка 1.py как модуля (имя файла не подходит для обычного import)"""
+    spec = importlib.util.spec_from_file_location("simple_nn", path)
+    module = importlib.util.module_from_spec(spec)
+    # Регистрация в sys.modules нужна для pickle функций модуля (пулы процессов в 1.py)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def normalize_params(params):
+    """Параметры героев в [0, 1] по диапазонам слайдеров"""
+    low = np.array([SLIDER_RANGES[name][0] for name in IMPACT_PARAMS], dtype=np.float64)
+    high = np.array([SLIDER_RANGES[name][1] for name in IMPACT_PARAMS], dtype=np.float64)
+    return (np.asarray(params, dtype=np.float64) - low) / (high - low)
+
+
+@st.cache_resource
+def train_winrate_model(patch=None, hidden_size=8, epochs=WINRATE_MODEL_EPOCHS, seed=PICKRATE_SEED):
+    """
+    Регрессор параметры героя -> винрейт (в единицах (винрейт - 50) / 10).
+
+    Возвращает (сеть, число обучающих примеров, итоговая MSE).
+    """
+    nn_module = load_nn_module()
+    winrates = get_dashboard_stats(patch)[0]
+    X = normalize_params(hero_param_matrix(HEROES))
+    y = ((np.array([winrates[hero] for hero in HEROES]) - 50) / 10)[:, None]
+
+    model = nn_module.SimpleNeuralNetwork(input_size=len(IMPACT_PARAMS), hidden_size=hidden_size,
+                                          output_size=1, learning_rate=0.01, seed=seed,
+                                          optimizer="adam")
+    model.train(X, y, epochs=epochs, verbose=False)
+    return model, len(X), float(model.loss_history[-1])
+
+
+def get_impact_predictor(model_name=None, patch=None):
+    """
+    Функция прогноза изменения винрейта для evaluate_impact (None - эвристика).
+
+    Прогноз разностный: модель(предлагаемые) - модель(текущие), так что
+    систематическая ошибка модели на самом герое вычитается.
+    """
+    if model_name != IMPACT_MODELS[1]:
+        return None
+    model = train_winrate_model(patch)[0]
+
+    def predict_delta(current, proposed):
+        current = np.asarray(current, dtype=np.float64)
+        proposed = np.asarray(proposed, dtype=np.float64)
+        n_params = len(IMPACT_PARAMS)
+        base = model.predict(normalize_params(current).reshape(-1, n_params))
+        new = model.predict(normalize_params(proposed).reshape(-1, n_params))
+        return (new.reshape(proposed.shape[:-1]) - base.reshape(current.shape[:-1])) * 10
+
+    return predict_delta
+
+# =================== ETL: МАТЧИ → СТАТИСТИКА ГЕРОЕВ ===================
+# Матчи читаются пачками из источника, каждая пачка разбирается в массивы
+# героев команд и сразу агрегируется - сырой JSON целиком в памяти не держится.
+
+class OpenDotaSource:
+    """Матчи из OpenDota API (/publicMatches, постранично от новых к старым)"""
+    
+    def __init__(self, base_url=OPENDOTA_URL, api_key=None, timeout=10, session=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        if session is None:
+            # Одна сессия на источник: соединения переиспользуются между страницами,
+            # временные ошибки и лимит запросов (429) повторяются с задержкой
+            session = requests.Session()
+            retry = Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+    
+    def iter_batches(self, limit):
+        """Пачки записей матчей, всего не больше limit"""
+        less_than_match_id = None
+        remaining = limit
+        while remaining > 0:
+            params = {}
+            if less_than_match_id is not None:
+                params["less_than_match_id"] = less_than_match_id
+            if self.api_key:
+                params["api_key"] = self.api_key
+            response = self.session.get(f"{self.base_url}/publicMatches",
+                                        params=params, timeout=self.timeout)
+            response.raise_for_status()
+            page = response.json()
+            if not page:
+                return
+            
+            less_than_match_id = min(record["match_id"] for record in page)
+            batch = page[:remaining]
+            remaining -= len(batch)
+            yield batch
+
+
+class JsonLinesSource:
+    """
+    Матчи из файла JSON Lines - по одной записи матча OpenDota на строку
+    
+    Используется для офлайн-прогонов пайплайна без сети.
+    file - путь или открытый файловый объект (текстовый или бинарный).
+    """
+    
+    def __init__(self, file, batch_size=ETL_BATCH_SIZE):
+        self.file = file
+        self.batch_size = batch_size
+    
+    def iter_batches(self, limit):
+        """Пачки записей матчей, всего не больше limit"""
+        f = open(self.file, "rb") if isinstance(self.file, str) else self.file
+        try:
+            batch = []
+            n_read = 0
+            for line in f:
+                if n_read >= limit:
+                    break
+                if not line.strip():
+                    continue
+                batch.append(json.loads(line))
+                n_read += 1
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            if f is not self.file:
+                f.close()
+
+
+def _parse_team(team):
+    """Состав команды: список id или строка "1,2,3,4,5" (старый формат OpenDota)"""
+    if isinstance(team, str):
+        return [int(hero_id) for hero_id in team.split(",") if hero_id]
+    return list(team or [])
+
+
+def parse_match_batch(records):
+    """
+    Разбор пачки матчей в массивы
+    
+    Возвращает (radiant, dire, radiant_win): матрицы id героев формы
+    (n, 5) и булев вектор победы Radiant. Матчи с неполными командами,
+    без результата или с id героя вне [0, MAX_HERO_ID] пропускаются.
+    """
+    radiant, dire, radiant_win = [], [], []
+    for record in records:
+        if record.get("radiant_win") is None:
+            continue
+        radiant_team = _parse_team(record.get("radiant_team"))
+        dire_team = _parse_team(record.get("dire_team"))
+        if len(radiant_team) != 5 or len(dire_team) != 5:
+            continue
+        # Одна запись с неизвестным id не должна ронять агрегацию всей пачки
+        if not all(0 <= hero_id <= MAX_HERO_ID for hero_id in radiant_team + dire_team):
+            continue
+        radiant.append(radiant_team)
+        dire.append(dire_team)
+        radiant_win.append(bool(record["radiant_win"]))
+    
+    return (np.array(radiant, dtype=np.int16).reshape(-1, 5),
+            np.array(dire, dtype=np.int16).reshape(-1, 5),
+            np.array(radiant_win, dtype=bool))
+
+
+# Пары позиций внутри команды из 5 героев (i < j)
+_TEAM_PAIRS = np.triu_indices(5, k=1)
+
+
+class HeroAggregator:
+    """
+    Инкрементальный подсчёт матчей, выборов и побед по id героя
+    
+    Для полных составов команд считаются и матрицы пар (n_heroes, n_heroes):
+    matchup_games[h, g] - матчей героя h против g, matchup_wins[h, g] - побед
+    h в них; synergy_games/synergy_wins - то же для h и g в одной команде.
+    Пары накапливаются одним bincount по плоскому индексу h * n_heroes + g.
+    """
+    
+    def __init__(self, n_heroes=MAX_HERO_ID + 1):
+        self.n_heroes = n_heroes
+        self.matches = 0
+        # Записи матчей, отброшенные при разборе (см. parse_match_batch)
+        self.skipped = 0
+        self.picks = np.zeros(n_heroes, dtype=np.int64)
+        self.wins = np.zeros(n_heroes, dtype=np.int64)
+        # Матчи с полными составами (в матрицах пар учтены только они)
+        self.pair_matches = 0
+        self.matchup_games = np.zeros((n_heroes, n_heroes), dtype=np.int64)
+        self.matchup_wins = np.zeros((n_heroes, n_heroes), dtype=np.int64)
+        self.synergy_games = np.zeros((n_heroes, n_heroes), dtype=np.int64)
+        self.synergy_wins = np.zeros((n_heroes, n_heroes), dtype=np.int64)
+    
+    def update_records(self, records):
+        """Разбор и добавление пачки записей матчей с подсчётом отброшенных"""
+        radiant, dire, radiant_win = parse_match_batch(records)
+        self.skipped += len(records) - radiant_win.shape[0]
+        self.update(radiant, dire, radiant_win)
+    
+    def update(self, radiant, dire, radiant_win):
+        """Добавление пачки разобранных матчей (см. parse_match_batch)"""
+        self.matches += radiant_win.shape[0]
+        self.picks += np.bincount(radiant.ravel(), minlength=self.n_heroes)
+        self.picks += np.bincount(dire.ravel(), minlength=self.n_heroes)
+        self.wins += np.bincount(radiant[radiant_win].ravel(), minlength=self.n_heroes)
+        self.wins += np.bincount(dire[~radiant_win].ravel(), minlength=self.n_heroes)
+        self._update_pairs(radiant, dire, radiant_win)
+    
+    def _pair_counts(self, first, second):
+        """Счётчики пар (first[k], second[k]) и (second[k], first[k]) как матрица"""
+        n = self.n_heroes
+        index = np.concatenate([(first.astype(np.intp) * n + second).ravel(),
+                                (second.astype(np.intp) * n + first).ravel()])
+        return np.bincount(index, minlength=n * n).reshape(n, n)
+    
+    def _update_pairs(self, radiant, dire, radiant_win):
+        self.pair_matches += radiant_win.shape[0]
+        
+        # Противостояния: все 25 пар (герой Radiant, герой Dire) матча
+        vs_radiant = np.broadcast_to(radiant[:, :, None], (len(radiant), 5, 5))
+        vs_dire = np.broadcast_to(dire[:, None, :], (len(dire), 5, 5))
+        self.matchup_games += self._pair_counts(vs_radiant, vs_dire)
+        # Победы: (победитель, проигравший) - одна ориентация пары
+        n = self.n_heroes
+        won = np.concatenate([
+            (vs_radiant[radiant_win].astype(np.intp) * n + vs_dire[radiant_win]).ravel(),
+            (vs_dire[~radiant_win].astype(np.intp) * n + vs_radiant[~radiant_win]).ravel(),
+        ])
+        self.matchup_wins += np.bincount(won, minlength=n * n).reshape(n, n)
+        
+        # Союзы: 10 пар внутри каждой команды
+        first, second = _TEAM_PAIRS
+        for team, team_won in ((radiant, radiant_win), (dire, ~radiant_win)):
+            self.synergy_games += self._pair_counts(team[:, first], team[:, second])
+            self.synergy_wins += self._pair_counts(team[team_won][:, first],
+                                                   team[team_won][:, second])
+    
+    def update_picks(self, hero_ids, wins, n_matches):
+        """Добавление отдельных выборов героев (строк вида герой/победа)"""
+        self.matches += n_matches
+        self.picks += np.bincount(hero_ids, minlength=self.n_heroes)
+        self.wins += np.bincount(hero_ids[wins], minlength=self.n_heroes)
+    
+    def hero_frame(self, hero_ids=HERO_IDS):
+        """Таблица винрейта и частоты выбора для героев из hero_ids"""
+        ids = np.array(list(hero_ids.values()))
+        return hero_stats_frame(list(hero_ids), self.matches, self.picks[ids], self.wins[ids])
+
+
+def hero_stats_frame(heroes, matches, picks, wins):
+    """Таблица винрейта и частоты выбора по счётчикам матчей/выборов/побед"""
+    picks = np.asarray(picks)
+    wins = np.asarray(wins)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        winrate = np.where(picks > 0, wins / picks * 100, np.nan)
+    pickrate = picks / max(1, matches) * 100
+    return pd.DataFrame({
+        "Герой": heroes,
+        "Матчей": matches,
+        "Выборов": picks,
+        "Побед": wins,
+        "Винрейт (%)": winrate.round(1),
+        "Частота выбора (%)": pickrate.round(1),
+    })
+
+
+class ByteCountingReader:
+    """Обёртка файлового объекта, считающая прочитанные байты (для прогресса)"""
+    
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+    
+    def readline(self, size=-1):
+        data = self.file.readline(size)
+        self.bytes_read += len(data)
+        return data
+    
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+
+# Типы колонок CSV-дампа: одна строка - один выбор героя в матче.
+# Вместо hero_id может быть колонка hero с именем героя.
+CSV_DTYPES = {
+    "match_id": "int64",
+    # int32, а не int16: pandas молча заворачивает переполнение (70000 -> 4464),
+    # и такой id прошёл бы проверку диапазона в _iter_csv_picks
+    "hero_id": "int32",
+    "hero": pd.CategoricalDtype(categories=list(HERO_IDS)),
+    "win": "bool",
+}
+# id героя по коду категории колонки hero
+_HERO_ID_BY_CODE = np.array(list(HERO_IDS.values()), dtype=np.int16)
+
+
+def _iter_csv_picks(reader, chunksize):
+    """
+    Куски CSV-дампа как (hero_ids, wins, число новых матчей)
+    
+    Матчи считаются по смене match_id, поэтому строки одного матча
+    должны идти подряд (так выгружают дампы).
+    """
+    # Заголовок читается вручную: pd.read_csv(nrows=0) забрал бы из потока целый блок
+    header_line = reader.readline()
+    if isinstance(header_line, bytes):
+        header_line = header_line.decode("utf-8-sig")
+    header = next(csv.reader([header_line]), [])
+    hero_column = "hero_id" if "hero_id" in header else "hero"
+    columns = ["match_id", hero_column, "win"]
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"В CSV нет колонок: {', '.join(missing)}")
+    
+    chunks = pd.read_csv(reader, header=None, names=list(header), usecols=columns,
+                         dtype={column: CSV_DTYPES[column] for column in columns},
+                         true_values=["true", "True", "1"], false_values=["false", "False", "0"],
+                         chunksize=chunksize)
+    last_match_id = None
+    for chunk in chunks:
+        match_ids = chunk["match_id"].to_numpy()
+        if match_ids.size == 0:
+            continue
+        n_matches = np.count_nonzero(np.diff(match_ids)) + 1
+        if match_ids[0] == last_match_id:
+            n_matches -= 1
+        last_match_id = match_ids[-1]
+        
+        wins = chunk["win"].to_numpy()
+        if hero_column == "hero":
+            codes = chunk["hero"].cat.codes.to_numpy()
+            known = codes >= 0  # герои вне HERO_IDS отбрасываются
+            hero_ids = _HERO_ID_BY_CODE[codes[known]]
+            wins = wins[known]
+        else:
+            hero_ids = chunk["hero_id"].to_numpy()
+            known = (hero_ids >= 0) & (hero_ids <= MAX_HERO_ID)  # иначе bincount длиннее счётчиков
+            hero_ids = hero_ids[known]
+            wins = wins[known]
+        yield hero_ids, wins, n_matches
+
+
+def parse_uploaded_file(file, name, size, aggregator=None, progress=None,
+                        chunksize=CSV_CHUNK_ROWS):
+    """
+    Потоковый разбор загруженного дампа матчей
+    
+    .csv - строки выборов (match_id, hero_id или hero, win), читаются
+    кусками по chunksize строк с явными типами; .json - JSON Lines
+    с записями матчей OpenDota, читаются пачками. Каждый кусок сразу
+    агрегируется, файл целиком в память не загружается.
+    progress(bytes_read, size) вызывается после каждого куска.
+    """
+    if aggregator is None:
+        aggregator = HeroAggregator()
+    reader = ByteCountingReader(file)
+    
+    if name.lower().endswith(".csv"):
+        for hero_ids, wins, n_matches in _iter_csv_picks(reader, chunksize):
+            aggregator.update_picks(hero_ids, wins, n_matches)
+            if progress is not None:
+                progress(reader.bytes_read, size)
+    else:
+        for batch in JsonLinesSource(reader, batch_size=ETL_BATCH_SIZE * 10).iter_batches(float("inf")):
+            aggregator.update_records(batch)
+            if progress is not None:
+                progress(reader.bytes_read, size)
+    return aggregator
+
+
+def run_etl(source, limit, aggregator=None, progress=None):
+    """
+    ETL-пайплайн: пачки матчей из source → разбор → агрегация
+    
+    progress(processed, limit) вызывается после каждой пачки.
+    Возвращает агрегатор (новый или переданный для дозаполнения).
+    """
+    if aggregator is None:
+        aggregator = HeroAggregator()
+    processed = 0
+    for batch in source.iter_batches(limit):
+        aggregator.update_records(batch)
+        processed += len(batch)
+        if progress is not None:
+            progress(processed, limit)
+    return aggregator
+
+
+# =================== ХРАНИЛИЩЕ АГРЕГАТОВ ===================
+# Каждый прогон ETL дописывает в раздел своего патча новый Parquet-файл
+# со счётчиками по всем id героев; при чтении счётчики суммируются.
+# Сырые матчи не хранятся и не пересчитываются при старте приложения.
+
+def append_to_hero_store(aggregator, patch, store_dir=HERO_STORE_DIR):
+    """
+    Дописывание агрегатов прогона ETL в раздел patch
+    
+    Задачи ETL пишут в живой датасет, пока дашборд его читает, поэтому файл
+    сначала пишется под скрытым временным именем (ds.dataset пропускает
+    файлы на "." и не с .parquet) и появляется в разделе через os.replace.
+    """
+    hero_ids = np.arange(1, aggregator.n_heroes)
+    frame = pd.DataFrame({
+        "hero_id": hero_ids.astype(np.int16),
+        # Число матчей пишется в каждую строку, чтобы сумма по файлам давала
+        # общее число матчей патча и для героев без выборов
+        "matches": np.full(hero_ids.shape, aggregator.matches, dtype=np.int64),
+        "picks": aggregator.picks[1:],
+        "wins": aggregator.wins[1:],
+    })
+    # Имя раздела кодируется как URI - так же, как при записи самим pyarrow
+    partition_dir = store_dir / f"patch={quote(patch, safe='')}"
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    file_name = f"{uuid.uuid4().hex}.parquet"
+    tmp_path = partition_dir / f".{file_name}.tmp"
+    frame.to_parquet(tmp_path, engine="pyarrow", index=False)
+    os.replace(tmp_path, partition_dir / file_name)
+    list_store_patches.clear()
+    read_hero_store.clear()
+    train_winrate_model.clear()
+
+
+@st.cache_data
+def list_store_patches(store_dir=HERO_STORE_DIR):
+    """Патчи, по которым в хранилище есть данные"""
+    if not store_dir.exists():
+        return []
+    # pyarrow кодирует значения hive-разделов как URI ("7.37 b" -> "patch=7.37%20b"),
+    # а фильтр read_hero_store сравнивает с декодированным значением
+    return sorted(unquote(path.name.split("=", 1)[1]) for path in store_dir.iterdir()
+                  if path.is_dir() and path.name.startswith("patch="))
+
+
+@st.cache_data
+def read_hero_store(patch, hero_ids, store_dir=HERO_STORE_DIR):
+    """
+    Суммарные счётчики героев hero_ids за патч
+    
+    Фильтр передаётся в pyarrow: читаются только файлы раздела patch,
+    только нужные колонки, а строки отбираются по hero_id при сканировании.
+    Возвращает DataFrame с индексом hero_id и колонками matches/picks/wins.
+    """
+    dataset = ds.dataset(store_dir, format="parquet", partitioning=HERO_STORE_PARTITIONING)
+    table = dataset.to_table(
+        columns=["hero_id", "matches", "picks", "wins"],
+        filter=(ds.field("patch") == patch) & ds.field("hero_id").isin(list(hero_ids)),
+    )
+    return table.to_pandas().groupby("hero_id").sum()
+
+
+@st.cache_resource
+def get_pair_store_lock():
+    """Блокировка чтения-изменения-записи матриц пар (задачи ETL идут параллельно)"""
+    return threading.Lock()
+
+
+PAIR_ARRAYS = ("matchup_games", "matchup_wins", "synergy_games", "synergy_wins")
+
+
+def append_to_pair_store(aggregator, patch, store_dir=HERO_PAIRS_DIR):
+    """
+    Прибавление матриц пар прогона ETL к сохранённым для патча
+    
+    Файл переписывается целиком (матрицы ~160x160 - сотни КиБ), но атомарно:
+    через временный файл и os.replace, так что читатели не видят его частично.
+    """
+    if not PATCH_PATTERN.fullmatch(patch):
+        raise ValueError(f"Некорректный патч: {patch!r}")
+    path = store_dir / f"{patch}.npz"
+    if not path.resolve().is_relative_to(store_dir.resolve()):
+        raise ValueError(f"Путь матриц пар вне хранилища: {path}")
+    with get_pair_store_lock():
+        totals = {name: getattr(aggregator, name) for name in PAIR_ARRAYS}
+        pair_matches = aggregator.pair_matches
+        if path.exists():
+            with np.load(path) as saved:
+                n = min(aggregator.n_heroes, saved["matchup_games"].shape[0])
+                totals = {name: totals[name].copy() for name in PAIR_ARRAYS}
+                for name in PAIR_ARRAYS:
+                    totals[name][:n, :n] += saved[name][:n, :n]
+                pair_matches += int(saved["matches"])
+        store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp_path, matches=pair_matches, **totals)
+        os.replace(tmp_path, path)
+    read_pair_store.clear()
+
+
+@st.cache_data
+def read_pair_store(patch, store_dir=HERO_PAIRS_DIR):
+    """Сохранённые матрицы пар патча (словарь массивов) или None"""
+    if not PATCH_PATTERN.fullmatch(patch):
+        return None
+    path = store_dir / f"{patch}.npz"
+    if not path.exists():
+        return None
+    with np.load(path) as saved:
+        return {name: saved[name] for name in saved.files}
+
+
+def pair_winrate_frame(patch, kind, min_games=1, hero_ids=HERO_IDS):
+    """
+    Матрица винрейтов пар героев (%): kind="matchup" - строка против столбца,
+    kind="synergy" - строка вместе со столбцом. Пары с числом матчей меньше
+    min_games - NaN. hero_ids=None - все герои, встречавшиеся в матчах.
+    """
+    pairs = read_pair_store(patch)
+    if pairs is None:
+        return None
+    games, wins = pairs[f"{kind}_games"], pairs[f"{kind}_wins"]
+    if hero_ids is None:
+        ids = np.flatnonzero(games.sum(axis=1))
+        names = {hero_id: name for name, hero_id in HERO_IDS.items()}
+        labels = [names.get(hero_id, f"#{hero_id}") for hero_id in ids]
+    else:
+        ids = np.array(list(hero_ids.values()))
+        labels = list(hero_ids)
+    games, wins = games[np.ix_(ids, ids)], wins[np.ix_(ids, ids)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        winrate = np.where(games >= max(1, min_games), wins / games * 100, np.nan)
+    return pd.DataFrame(winrate, index=labels, columns=labels)
+
+
+@st.cache_resource
+def build_pair_figure(patch, kind, min_games, all_heroes, version):
+    """Тепловая карта винрейтов пар; version - число матчей в файле (сброс кэша после дозаписи)"""
+    frame = pair_winrate_frame(patch, kind, min_games, None if all_heroes else HERO_IDS)
+    title = "Винрейт героя (строка) против героя (столбец)" if kind == "matchup" \
+        else "Винрейт героев (строка и столбец) в одной команде"
+    fig = px.imshow(frame, color_continuous_scale="RdYlGn", color_continuous_midpoint=50,
+                    zmin=0, zmax=100, aspect="auto", text_auto=False if all_heroes else ".0f",
+                    labels={"color": "Винрейт (%)"})
+    fig.update_layout(title=title)
+    return fig
+
+
+def get_hero_stats(patch, hero_ids=HERO_IDS):
+    """Таблица статистики героев за патч из хранилища"""
+    counts = read_hero_store(patch, tuple(hero_ids.values()))
+    counts = counts.reindex(list(hero_ids.values()), fill_value=0)
+    matches = int(counts["matches"].max()) if len(counts) else 0
+    return hero_stats_frame(list(hero_ids), matches, counts["picks"].to_numpy(),
+                            counts["wins"].to_numpy())
+
+
+def get_dashboard_stats(patch=None):
+    """
+    Винрейты и частоты выбора для дашборда
+    
+    patch=None - демо-данные; иначе агрегаты патча из хранилища,
+    для героев без матчей - демо-значения.
+    """
+    winrates = dict(WINRATES)
+    pickrates = dict(get_pickrates(tuple(HEROES)))
+    if patch is not None:
+        hero_stats = get_hero_stats(patch)
+        hero_stats = hero_stats[hero_stats["Выборов"] > 0]
+        winrates.update(zip(hero_stats["Герой"], hero_stats["Винрейт (%)"].astype(float)))
+        pickrates.update(zip(hero_stats["Герой"], hero_stats["Частота выбора (%)"].astype(float)))
+    return winrates, pickrates
+
+
+def ingest_matches(source, limit, patch, progress=None):
+    """Прогон ETL; агрегаты дописываются в хранилище. progress(доля, текст)"""
+    def on_progress(processed, total):
+        if progress is not None:
+            progress(min(1.0, processed / total), f"Обработано матчей: {processed}")
+    
+    aggregator = run_etl(source, limit, progress=on_progress)
+    if aggregator.matches:
+        append_to_hero_store(aggregator, patch)
+    if aggregator.pair_matches:
+        append_to_pair_store(aggregator, patch)
+    return aggregator
+
+
+def ingest_uploaded_file(data, name, patch, progress=None):
+    """Разбор загруженного файла (байты) с прогрессом по прочитанным байтам"""
+    def on_progress(bytes_read, total):
+        if progress is not None:
+            progress(min(1.0, bytes_read / max(1, total)),
+                     f"Прочитано {bytes_read / 2 ** 20:.1f} из {total / 2 ** 20:.1f} МиБ")
+    
+    # BytesIO над bytes не копирует их, пока в него не пишут; у задачи
+    # своя позиция чтения, даже если тот же файл разбирают другие задачи
+    aggregator = parse_uploaded_file(io.BytesIO(data), name, len(data), progress=on_progress)
+    if aggregator.matches:
+        append_to_hero_store(aggregator, patch)
+    # CSV-строки выборов не содержат составов - матрицы пар только из JSON
+    if aggregator.pair_matches:
+        append_to_pair_store(aggregator, patch)
+    return aggregator
+
+# =================== ФОНОВЫЕ ЗАДАЧИ ===================
+# Долгие загрузки выполняются в пуле потоков, общем для всех сессий
+# (st.cache_resource), а не в потоке скрипта: перезапуски не блокируются,
+# а одинаковые задачи разных пользователей объединяются по ключу.
+
+JOB_WORKERS = 2
+# Период опроса статуса задач фрагментом, секунд
+JOB_POLL_INTERVAL = 1.0
+# Сколько завершённых задач хранить для отображения
+JOB_HISTORY = 20
+
+JOB_STATUS_LABELS = {
+    "pending": "⏳ В очереди",
+    "running": "🔄 Выполняется",
+    "done": "✅ Готово",
+    "failed": "❌ Ошибка",
+}
+
+
+class Job:
+    """Фоновая задача: статус, прогресс и результат видны всем сессиям"""
+    
+    def __init__(self, key, description):
+        self.key = key
+        self.description = description
+        self.status = "pending"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+    
+    @property
+    def active(self):
+        return self.status in ("pending", "running")
+    
+    def report(self, progress, message=""):
+        """Колбэк прогресса для функции задачи (вызывается из рабочего потока)"""
+        self.progress = progress
+        self.message = message
+
+
+class JobRunner:
+    """Пул потоков с реестром задач; повторная отправка активной задачи её не дублирует"""
+    
+    def __init__(self, max_workers=JOB_WORKERS, history=JOB_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etl-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._history = history
+    
+    def submit(self, key, description, fn, *args):
+        """
+        Запуск fn(*args, progress=job.report) в фоне
+        
+        Если задача с таким ключом ещё выполняется, возвращается она же.
+        Возвращает (задача, True - если запущена новая).
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.active:
+                return job, False
+            job = Job(key, description)
+            self._jobs[key] = job
+            self._trim_history()
+        self._executor.submit(self._run, job, fn, args)
+        return job, True
+    
+    def _run(self, job, fn, args):
+        job.status = "running"
+        try:
+            result = fn(*args, progress=job.report)
+        except Exception as e:
+            status, job.error = "failed", str(e)
+        else:
+            status, job.result, job.progress = "done", result, 1.0
+        # finished_at выставляется до статуса и под блокировкой: неактивная задача
+        # в _trim_history всегда имеет время завершения
+        with self._lock:
+            job.finished_at = time.time()
+            job.status = status
+    
+    def _trim_history(self):
+        finished = sorted((job for job in self._jobs.values() if not job.active),
+                          key=lambda job: job.finished_at or 0)
+        for job in finished[:max(0, len(finished) - self._history)]:
+            del self._jobs[job.key]
+    
+    def jobs(self):
+        """Задачи, новые сначала"""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.submitted_at, reverse=True)
+    
+    def has_active(self):
+        return any(job.active for job in self.jobs())
+
+
+@st.cache_resource
+def get_job_runner():
+    """Единый для всех сессий исполнитель фоновых задач"""
+    return JobRunner()
+
+
+def submit_opendota_job(limit, patch):
+    """Фоновая загрузка матчей OpenDota"""
+    return get_job_runner().submit(("opendota", patch, limit),
+                                   f"OpenDota: {limit} матчей, патч {patch}",
+                                   ingest_matches, OpenDotaSource(), limit, patch)
+
+
+def submit_upload_job(uploaded_file, patch):
+    """
+    Фоновый разбор загруженного файла
+    
+    Задаче передаются сами байты загрузки без копии: getvalue() у UploadedFile
+    возвращает его неизменяемый буфер, а файловый объект создаётся в задаче.
+    """
+    return get_job_runner().submit(("file", patch, uploaded_file.file_id),
+                                   f"Файл {uploaded_file.name}, патч {patch}",
+                                   ingest_uploaded_file, uploaded_file.getvalue(),
+                                   uploaded_file.name, patch)
+
+
+def render_jobs(runner):
+    """Список задач с прогрессом"""
+    for job in runner.jobs():
+        st.write(f"**{job.description}** — {JOB_STATUS_LABELS[job.status]}")
+        if job.status == "running":
+            st.progress(job.progress, text=job.message or None)
+        elif job.status == "done":
+            skipped = f", пропущено записей: {job.result.skipped}" if job.result.skipped else ""
+            st.caption(f"Обработано матчей: {job.result.matches}{skipped}")
+        elif job.status == "failed":
+            st.caption(f"Ошибка: {job.error}")
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def render_jobs_live():
+    """Опрос задач, пока есть активные; по завершении - полный перезапуск"""
+    runner = get_job_runner()
+    render_jobs(runner)
+    if not runner.has_active():
+        # Полный перезапуск обновляет список патчей и прекращает опрос
+        st.rerun()
+
+# =================== ГЕНЕРАЦИЯ ПРЕДМЕТОВ ===================
+# Характеристики предметов семплируются пачкой из NumPy-генератора,
+# баланс оценивается детерминированной моделью бюджета силы:
+# сила = урон + DEFENSE_POWER * защита, бюджет = стоимость / GOLD_PER_POWER
+# с поправками на тип и редкость; оценка тем выше, чем ближе сила к бюджету.
+
+ITEM_TYPES = ["Оружие", "Броня", "Артефакт", "Зелье"]
+ITEM_STYLES = ["Фэнтези", "Киберпанк", "Исторический", "Мистический"]
+ITEM_RARITIES = ["Обычный", "Редкий", "Эпический", "Легендарный"]
+# Вероятности редкостей при генерации
+RARITY_PROBS = [0.5, 0.3, 0.15, 0.05]
+
+# Диапазоны характеристик (включительно)
+ITEM_DAMAGE_RANGE = (10, 50)
+ITEM_DEFENSE_RANGE = (0, 15)
+ITEM_COST_RANGE = (2000, 7000)
+
+# Единица защиты по силе равна стольким единицам урона
+DEFENSE_POWER = 3.0
+GOLD_PER_POWER = 100.0
+# Редкие предметы дают больше силы за то же золото
+RARITY_BUDGET = np.array([1.0, 1.15, 1.3, 1.5])
+# Зелья одноразовые - им положено больше силы за золото, артефакты - универсальны
+ITEM_TYPE_BUDGET = {"Оружие": 1.0, "Броня": 1.0, "Артефакт": 0.9, "Зелье": 1.6}
+
+# Пороги оценки баланса (как у прежней демо-оценки)
+ITEM_BALANCE_BINS = [0.4, 0.7]
+ITEM_BALANCE_LABELS = ("❌ Дисбаланс", "⚠️ Требует доработки", "✅ Сбалансирован")
+
+MAX_ITEM_BATCH = 200_000
+
+
+def sample_items(n, item_type, seed=None):
+    """Пачка из n предметов типа item_type: словарь массивов характеристик"""
+    rng = np.random.default_rng(seed)
+    return {
+        "type": np.full(n, ITEM_TYPES.index(item_type), dtype=np.int8),
+        "damage": rng.integers(ITEM_DAMAGE_RANGE[0], ITEM_DAMAGE_RANGE[1] + 1, n),
+        "defense": rng.integers(ITEM_DEFENSE_RANGE[0], ITEM_DEFENSE_RANGE[1] + 1, n),
+        "rarity": rng.choice(len(ITEM_RARITIES), n, p=RARITY_PROBS).astype(np.int8),
+        "cost": rng.integers(ITEM_COST_RANGE[0], ITEM_COST_RANGE[1] + 1, n),
+    }
+
+
+def score_items(items):
+    """
+    Оценка баланса пачки предметов (детерминированная)
+    
+    Возвращает (сила, бюджет, оценка в [0, 1]): оценка = 1 - |ln(сила / бюджет)|,
+    т.е. перекос силы в 1.35 раза в любую сторону даёт 0.7, в 1.8 раза - 0.4.
+    """
+    type_budget = np.array([ITEM_TYPE_BUDGET[item_type] for item_type in ITEM_TYPES])
+    power = items["damage"] + DEFENSE_POWER * items["defense"]
+    budget = items["cost"] / GOLD_PER_POWER * RARITY_BUDGET[items["rarity"]] * type_budget[items["type"]]
+    score = np.clip(1 - np.abs(np.log(power / budget)), 0, 1)
+    return power, budget, score
+
+
+@st.cache_data
+def generate_item_batch(n, item_type, style, seed, rarities, min_score, top_n):
+    """
+    Пакетная генерация: n кандидатов, фильтр по редкости и оценке,
+    top_n лучших по оценке (при равенстве - более редкие) с описаниями
+    в стиле style. Возвращает (таблица лучших, число прошедших фильтр,
+    гистограмма оценок).
+    """
+    items = sample_items(n, item_type, seed)
+    power, budget, score = score_items(items)
+    
+    rarity_ok = np.isin(items["rarity"], [ITEM_RARITIES.index(rarity) for rarity in rarities])
+    passed = np.flatnonzero(rarity_ok & (score >= min_score))
+    order = passed[np.lexsort((-items["rarity"][passed], -score[passed]))][:top_n]
+    
+    frame = pd.DataFrame({
+        "Урон": items["damage"][order],
+        "Защита": items["defense"][order],
+        "Редкость": np.array(ITEM_RARITIES)[items["rarity"][order]],
+        "Стоимость": items["cost"][order],
+        "Сила": power[order].round(1),
+        "Бюджет": budget[order].round(1),
+        "Оценка баланса": score[order].round(3),
+    })
+    
+    # Описания - только для попавших в таблицу (варианты шаблонов тоже от seed)
+    engine = get_description_engine()
+    variants = engine.sample_variants(item_type, style, len(order), rng=[seed, len(order)],
+                                      min_consistency=STYLE_CONSISTENCY_MIN)
+    frame["Описание"], consistency = engine.describe(item_type, style, variants,
+                                                     items["damage"][order], items["defense"][order])
+    frame["Соответствие стилю"] = consistency.round(2)
+    histogram = np.histogram(score, bins=20, range=(0, 1))[0]
+    return frame, len(passed), histogram
+
+# =================== ОПИСАНИЯ ПРЕДМЕТОВ ===================
+# Описания собираются из корпуса фраз: для каждой пары (тип, стиль) все
+# сочетания существительного, вступления и детали заранее сводятся в шаблоны
+# с полями {damage}/{defense}; соответствие стилю считается по ключевым
+# словам один раз на шаблон, отрисованный текст кэшируется (LRU).
+
+# Существительные типов (все мужского рода - прилагательные корпуса согласуются)
+ITEM_NOUNS = {
+    "Оружие": ["клинок", "топор", "посох"],
+    "Броня": ["доспех", "щит", "нагрудник"],
+    "Артефакт": ["амулет", "талисман", "кристалл"],
+    "Зелье": ["эликсир", "отвар", "флакон"],
+}
+
+# Фраза характеристик по типу предмета
+ITEM_STAT_PHRASES = {
+    "Оружие": "Наносит {damage} ед. урона.",
+    "Броня": "Даёт {defense} ед. защиты.",
+    "Артефакт": "Усиливает урон на {damage} и защиту на {defense}.",
+    "Зелье": "На время даёт +{damage} к урону и +{defense} к защите.",
+}
+
+# Корпус стилей: вступления (с {noun}), детали и ключевые основы слов стиля
+STYLE_CORPUS = {
+    "Фэнтези": {
+        "openings": ["Древний {noun}, испещрённый рунами эльфов.",
+                     "Зачарованный {noun} из подгорных кузниц гномов.",
+                     "Сияющий {noun}, благословлённый лесными духами."],
+        "details": ["Излучает мягкое магическое свечение.",
+                    "Руны вспыхивают, когда рядом дракон.",
+                    "Эльфийские мастера вплели в него чары."],
+        "keywords": ["рун", "эльф", "гном", "зачар", "магич", "чар", "дракон", "дух", "кузн"],
+    },
+    "Киберпанк": {
+        "openings": ["Высокотехнологичный {noun} с голографическим интерфейсом.",
+                     "Модифицированный {noun} с нейроразъёмом корпорации.",
+                     "Хромированный {noun}, собранный в подпольной лаборатории."],
+        "details": ["Пиксели мерцают неоновым светом.",
+                    "Встроенный чип взламывает вражеские импланты.",
+                    "Неоновые диоды подключены к сети мегаполиса."],
+        "keywords": ["технолог", "голограф", "интерфейс", "нейро", "корпорац", "хром", "лаборатор",
+                     "пиксел", "неон", "чип", "имплант", "взлам", "сет", "мегаполис", "диод"],
+    },
+    "Исторический": {
+        "openings": ["Аутентичный {noun} эпохи Возрождения.",
+                     "Старинный {noun} из арсенала средневекового рыцаря.",
+                     "Трофейный {noun}, привезённый из крестового похода."],
+        "details": ["Следы использования говорят о многих битвах.",
+                    "На нём выбит герб королевской династии.",
+                    "Летописи упоминают его при осаде крепости."],
+        "keywords": ["эпох", "возрожден", "старин", "арсенал", "средневек", "рыцар", "трофей",
+                     "поход", "битв", "герб", "корол", "династ", "летопис", "осад", "крепост"],
+    },
+    "Мистический": {
+        "openings": ["{noun_cap}, хранящий тайны древних культов.",
+                     "Проклятый {noun}, найденный в заброшенном святилище.",
+                     "Призрачный {noun}, сотканный из лунного тумана."],
+        "details": ["При касании слышен шёпот теней.",
+                    "В полнолуние на нём проступают знаки ритуала.",
+                    "Владелец видит во сне забытых богов."],
+        "keywords": ["тайн", "культ", "прокля", "святилищ", "призрач", "лун", "туман", "шёпот",
+                     "тен", "ритуал", "сон", "сне", "бог"],
+    },
+}
+# Нейтральные детали без признаков стиля (разбавляют описание)
+COMMON_DETAILS = ["Ценится коллекционерами по всему миру.",
+                  "Удобно лежит в руке и почти ничего не весит.",
+                  "Мастер оставил на нём своё клеймо."]
+
+# Ниже этого соответствия стилю описание считается неудачным
+STYLE_CONSISTENCY_MIN = 0.6
+DESCRIPTION_CACHE_SIZE = 65_536
+
+
+class DescriptionEngine:
+    """
+    Индекс шаблонов описаний по (тип, стиль) с оценками соответствия стилю
+    
+    Шаблоны и оценки строятся один раз при создании; render кэширует
+    готовые тексты (в пакетах характеристики часто повторяются).
+    """
+    
+    def __init__(self, corpus=STYLE_CORPUS, nouns=ITEM_NOUNS, stat_phrases=ITEM_STAT_PHRASES,
+                 common_details=COMMON_DETAILS, cache_size=DESCRIPTION_CACHE_SIZE):
+        # Одно регулярное выражение на стиль: слова, начинающиеся с ключевых основ
+        self.style_patterns = {
+            style: re.compile(r"\b(?:%s)\w*" % "|".join(map(re.escape, spec["keywords"])),
+                              re.IGNORECASE)
+            for style, spec in corpus.items()
+        }
+        self.templates = {}
+        self.scores = {}
+        for item_type, type_nouns in nouns.items():
+            for style, spec in corpus.items():
+                templates = [
+                    f"{opening.format(noun=noun, noun_cap=noun.capitalize())} {detail} "
+                    f"{stat_phrases[item_type]}"
+                    for noun in type_nouns
+                    for opening in spec["openings"]
+                    for detail in spec["details"] + common_details
+                ]
+                self.templates[item_type, style] = templates
+                self.scores[item_type, style] = np.array(
+                    [self.style_consistency(template, style) for template in templates])
+        self.render = functools.lru_cache(maxsize=cache_size)(self._render)
+    
+    def style_consistency(self, text, style):
+        """
+        Доля ключевых слов стиля среди всех стилевых слов текста
+        
+        Сглаживание +1 в знаменателе: одно слово стиля даёт 0.5, два - 0.67,
+        а слова других стилей снижают оценку.
+        """
+        hits = {name: len(pattern.findall(text)) for name, pattern in self.style_patterns.items()}
+        return hits[style] / (sum(hits.values()) + 1)
+    
+    def _render(self, item_type, style, variant, damage, defense):
+        return self.templates[item_type, style][variant].format(damage=damage, defense=defense)
+    
+    def sample_variants(self, item_type, style, n, rng=None, min_consistency=0.0):
+        """n случайных номеров шаблонов с соответствием стилю не ниже min_consistency"""
+        rng = np.random.default_rng(rng)
+        allowed = np.flatnonzero(self.scores[item_type, style] >= min_consistency)
+        if allowed.size == 0:
+            allowed = np.arange(len(self.templates[item_type, style]))
+        return allowed[rng.integers(allowed.size, size=n)]
+    
+    def describe(self, item_type, style, variants, damage, defense):
+        """Тексты и оценки соответствия стилю для пачки предметов"""
+        texts = [self.render(item_type, style, variant, dmg, dfn)
+                 for variant, dmg, dfn in zip(variants.tolist(), damage.tolist(), defense.tolist())]
+        return texts, self.scores[item_type, style][variants]
+
+
+@st.cache_resource
+def get_description_engine():
+    """Общий для всех сессий движок описаний (шаблоны и LRU-кэш живут между перезапусками)"""
+    return DescriptionEngine()
+
+
+def regenerate_item_description(item_type, style):
+    """Новый вариант описания, подходящий стилю (колбэк кнопки во фрагменте)"""
+    st.session_state["item_description_variant"] = int(get_description_engine().sample_variants(
+        item_type, style, 1, min_consistency=STYLE_CONSISTENCY_MIN)[0])
+
+
+@st.fragment
+def item_description_fragment(item_type, style, damage, defense):
+    """Описание предмета; перегенерация перезапускает только этот фрагмент"""
+    engine = get_description_engine()
+    variant = st.session_state["item_description_variant"]
+    st.info(engine.render(item_type, style, variant, damage, defense))
+    
+    consistency = engine.scores[item_type, style][variant]
+    if consistency < STYLE_CONSISTENCY_MIN:
+        st.warning(f"⚠️ Описание недостаточно соответствует стилю {style} "
+                   f"({consistency:.0%}). Рекомендуется перегенерировать.")
+    else:
+        st.caption(f"Соответствие стилю: {consistency:.0%}")
+    st.button("Перегенерировать описание", key="regenerate_description",
+              on_click=regenerate_item_description, args=(item_type, style))
+
+# =================== СИМУЛЯЦИЯ ДУЭЛЕЙ ===================
+# Монте-Карло дуэлей героя с остальными героями (fight_simulator.py):
+# учитывает взаимодействие HP, брони, урона и скорости атаки, которое
+# линейная эвристика не видит.
+
+DUEL_SEED = 1488
+
+
+@st.cache_resource
+def get_duel_pool(max_workers=os.cpu_count()):
+    """
+    Пул процессов симуляции, общий для всех сессий
+    
+    Процессы запускаются через spawn, а не fork: процесс сервера Streamlit
+    многопоточный, и fork может унаследовать захваченные блокировки.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+@st.cache_data
+def run_duel_simulation(hero, params, n_fights, n_workers=None, seed=DUEL_SEED):
+    """
+    Дуэли героя с параметрами params (словарь) против текущих остальных героев
+    
+    Возвращает (таблица по соперникам, всего побед, всего дуэлей).
+    """
+    opponents = [name for name in HEROES if name != hero]
+    wins = fight_simulator.simulate_duels(
+        [params[name] for name in fight_simulator.STAT_NAMES],
+        [[HERO_STATS[name][stat] for stat in fight_simulator.STAT_NAMES] for name in opponents],
+        n_fights, seed=seed, n_workers=n_workers,
+        executor=get_duel_pool() if n_workers else None)
+    low, high = fight_simulator.wilson_interval(wins, n_fights)
+    frame = pd.DataFrame({
+        "Соперник": opponents,
+        "Доля побед (%)": (wins / n_fights * 100).round(1),
+        "95% ДИ (%)": [f"{lo * 100:.1f}–{hi * 100:.1f}" for lo, hi in zip(low, high)],
+    })
+    return frame, int(wins.sum()), n_fights * len(opponents)
+
 # =================== ЗАГОЛОВОК ===================
 st.title("Интеллектуальная система анализа баланса и генерации контента")
 st.markdown("---")
 
 # =================== ВКЛАДКИ ===================
-tab1, tab2, tab3, tab4 = st.tabs(["Дашборд", "Балансировка", "Генератор контента", "Загрузка данных"])
+# Вместо st.tabs (которые выполняют код всех вкладок при каждом перезапуске)
+# навигация через радио-кнопки: выполняется только выбранная вкладка.
+TABS = ["Дашборд", "Балансировка", "Генератор контента", "Загрузка данных"]
+
+# Префиксы ключей виджетов, чьё состояние нужно сохранять, пока их вкладка
+# не отрисовывается (иначе Streamlit сбрасывает его при переключении вкладок)
+PERSISTENT_WIDGET_PREFIXES = ("dashboard_", "balance_", "slider_", "item_", "data_", "matches_limit")
+
+for _key in list(st.session_state.keys()):
+    if isinstance(_key, str) and _key.startswith(PERSISTENT_WIDGET_PREFIXES):
+        st.session_state[_key] = st.session_state[_key]
+
+active_tab = st.radio("Раздел", TABS, horizontal=True, key="active_tab",
+                      label_visibility="collapsed")
+
+# Источник статистики героев: патч из хранилища или демо-данные
+stats_source = st.sidebar.selectbox("Статистика героев:",
+                                    [DEMO_DATA_LABEL] + list_store_patches()[::-1],
+                                    key="stats_source",
+                                    help="Патч из хранилища агрегатов или встроенные демо-данные")
+stats_patch = None if stats_source == DEMO_DATA_LABEL else stats_source
 
 # =================== ВКЛАДКА 1: ДАШБОРД ===================
-with tab1:
+if active_tab == "Дашборд":
     st.header("Общая статистика баланса")
     
-    # Используем фиксированные винрейты и генерируем pickrates
-    pickrates = {hero: random.randint(5, 30) for hero in HEROES}
-    
-    df_winrate = pd.DataFrame(list(WINRATES.items()), columns=["Герой", "Винрейт (%)"])
-    df_pickrate = pd.DataFrame(list(pickrates.items()), columns=["Герой", "Частота выбора (%)"])
+    # Агрегаты патча из хранилища или фиксированные винрейты и кэшированные pickrates
+    winrates, pickrates = get_dashboard_stats(stats_patch)
+    fig1, fig2 = build_dashboard_figures(winrates, pickrates)
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Топ-5 героев по винрейту")
-        fig1 = px.bar(df_winrate.sort_values(by="Винрейт (%)", ascending=False), 
-                      x="Герой", y="Винрейт (%)", color="Винрейт (%)")
         st.plotly_chart(fig1, use_container_width=True)
     
     with col2:
         st.subheader("Популярность героев")
-        fig2 = px.pie(df_pickrate, names="Герой", values="Частота выбора (%)")
         st.plotly_chart(fig2, use_container_width=True)
+    
+    # Матрицы пар героев - из файла патча, посчитанного при загрузке матчей
+    st.subheader("Противостояния и союзы героев")
+    pairs = None if stats_patch is None else read_pair_store(stats_patch)
+    if pairs is None:
+        st.info("Матрицы пар строятся по матчам с полными составами команд: загрузите матчи "
+                "(OpenDota или JSON) и выберите патч в боковой панели.")
+    else:
+        pair_col1, pair_col2, pair_col3 = st.columns(3)
+        with pair_col1:
+            pair_kind = st.radio("Матрица:", ["matchup", "synergy"], horizontal=True,
+                                 format_func={"matchup": "Противостояния", "synergy": "Союзы"}.get,
+                                 key="dashboard_pair_kind")
+        with pair_col2:
+            min_games = st.number_input("Минимум матчей пары:", min_value=1, value=10,
+                                        key="dashboard_min_games")
+        with pair_col3:
+            all_heroes = st.checkbox("Все герои", key="dashboard_all_heroes",
+                                     help="Все герои, встречавшиеся в матчах патча, а не только демо-пятёрка")
+        fig_pairs = build_pair_figure(stats_patch, pair_kind, min_games, all_heroes,
+                                      int(pairs["matches"]))
+        st.plotly_chart(fig_pairs, use_container_width=True)
+        st.caption(f"Матчей с полными составами: {int(pairs['matches'])}")
 
 
 # =================== ВКЛАДКА 2: БАЛАНСИРОВКА ===================
-with tab2:
+elif active_tab == "Балансировка":
     st.header("What-if анализ баланса")
     
-    # Статические характеристики для каждого героя
-    HERO_STATS = {
-        "Axe": {
-            "Здоровье": 720,
-            "Броня": 4.5,
-            "Урон": 75,
-            "Скорость атаки": 100,
-            "Мана": 150
-        },
-        "Джаггернаут": {
-            "Здоровье": 680,
-            "Броня": 2.0,
-            "Урон": 95,
-            "Скорость атаки": 140,
-            "Мана": 120
-        },
-        "Invoker": {
-            "Здоровье": 620,
-            "Броня": 0.5,
-            "Урон": 55,
-            "Скорость атаки": 80,
-            "Мана": 350
-        },
-        "Cristal maiden": {
-            "Здоровье": 600,
-            "Броня": 1.0,
-            "Урон": 50,
-            "Скорость атаки": 70,
-            "Мана": 300
-        },
-        "Pudge": {
-            "Здоровье": 800,
-            "Броня": 3.0,
-            "Урон": 85,
-            "Скорость атаки": 90,
-            "Мана": 180
-        }
-    }
-    
     hero = st.selectbox("Выберите героя:", HEROES, key="balance_hero")
+    impact_model = st.radio("Модель прогноза:", IMPACT_MODELS, horizontal=True, key="balance_model",
+                            help="Эвристика с весами ролей или нейросеть из 1.py, "
+                                 "обученная на параметрах и винрейтах героев")
+    if impact_model == IMPACT_MODELS[1]:
+        _, n_train, train_loss = train_winrate_model(stats_patch)
+        st.caption(f"Нейросеть обучена на {n_train} героях (MSE {train_loss:.4f}). "
+                   "Прогноз разностный: модель(новые) − модель(текущие) + текущий винрейт.")
     
     st.subheader(f"Характеристики героя: {hero}")
     
@@ -118,8 +1619,8 @@ with tab2:
         st.metric("Мана", f"{current_params['Мана']} MP", 
                  delta=None, help="Базовый запас маны")
         
-        # Используем фиксированный винрейт из словаря WINRATES
-        current_winrate = WINRATES[hero]
+        # Винрейт из хранилища для выбранного патча (или демо-значение)
+        current_winrate = get_dashboard_stats(stats_patch)[0][hero]
         st.metric("Текущий винрейт", f"{current_winrate}%", 
                  delta=None, help="Актуальный винрейт на основе статистики")
     
@@ -129,88 +1630,75 @@ with tab2:
         # Слайдеры с реалистичными диапазонами
         proposed_params["Здоровье"] = st.slider(
             "Здоровье (HP)", 
-            min_value=300, 
-            max_value=1200, 
+            min_value=SLIDER_RANGES["Здоровье"][0], 
+            max_value=SLIDER_RANGES["Здоровье"][1], 
             value=current_params["Здоровье"],
-            step=10,
+            step=SLIDER_RANGES["Здоровье"][2],
             key=f"slider_hp_{hero}",
             help="Изменение базового здоровья"
         )
         
         proposed_params["Броня"] = st.slider(
             "Броня", 
-            min_value=-5.0, 
-            max_value=20.0, 
+            min_value=SLIDER_RANGES["Броня"][0], 
+            max_value=SLIDER_RANGES["Броня"][1], 
             value=float(current_params["Броня"]),
-            step=0.5,
+            step=SLIDER_RANGES["Броня"][2],
             key=f"slider_armor_{hero}",
             help="Изменение базовой брони"
         )
         
         proposed_params["Урон"] = st.slider(
             "Урон", 
-            min_value=30, 
-            max_value=200, 
+            min_value=SLIDER_RANGES["Урон"][0], 
+            max_value=SLIDER_RANGES["Урон"][1], 
             value=current_params["Урон"],
-            step=5,
+            step=SLIDER_RANGES["Урон"][2],
             key=f"slider_damage_{hero}",
             help="Изменение базового урона"
         )
         
         proposed_params["Скорость атаки"] = st.slider(
             "Скорость атаки", 
-            min_value=20, 
-            max_value=300, 
+            min_value=SLIDER_RANGES["Скорость атаки"][0], 
+            max_value=SLIDER_RANGES["Скорость атаки"][1], 
             value=current_params["Скорость атаки"],
-            step=5,
+            step=SLIDER_RANGES["Скорость атаки"][2],
             key=f"slider_attack_speed_{hero}",
             help="Изменение базовой скорости атаки"
         )
         
         proposed_params["Мана"] = st.slider(
             "Мана (MP)", 
-            min_value=50, 
-            max_value=500, 
+            min_value=SLIDER_RANGES["Мана"][0], 
+            max_value=SLIDER_RANGES["Мана"][1], 
             value=current_params["Мана"],
-            step=10,
+            step=SLIDER_RANGES["Мана"][2],
             key=f"slider_mana_{hero}",
             help="Изменение базового запаса маны"
         )
     
+    with st.expander("⚔️ Настройки симуляции дуэлей"):
+        duel_fights = st.number_input("Дуэлей с каждым соперником:", min_value=1000, max_value=500_000,
+                                      value=20_000, step=1000, key="balance_duel_fights")
+        duel_parallel = st.checkbox("Считать в нескольких процессах", key="balance_duel_parallel",
+                                    help="Имеет смысл для сотен тысяч дуэлей: запуск процессов "
+                                         "стоит ~0.1-0.3 с")
+    
     # Кнопка для расчета
     if st.button("Рассчитать влияние изменений", type="primary", key="calculate_impact"):
-        # Расчет изменений в процентах
-        health_change_pct = ((proposed_params["Здоровье"] / current_params["Здоровье"]) - 1) * 100
-        armor_change_abs = proposed_params["Броня"] - current_params["Броня"]
-        damage_change_pct = ((proposed_params["Урон"] / current_params["Урон"]) - 1) * 100
-        attack_speed_change_pct = ((proposed_params["Скорость атаки"] / current_params["Скорость атаки"]) - 1) * 100
-        mana_change_pct = ((proposed_params["Мана"] / current_params["Мана"]) - 1) * 100
-        
-        # Веса влияния параметров на винрейт (зависит от роли героя)
-        if hero == "Axe" or hero == "Pudge":
-            # Танки/иницииаторы
-            weights = {"Здоровье": 0.35, "Броня": 0.3, "Урон": 0.15, "Скорость атаки": 0.1, "Мана": 0.1}
-        elif hero == "Джаггернаут":
-            # Керри/урон
-            weights = {"Здоровье": 0.2, "Броня": 0.15, "Урон": 0.35, "Скорость атаки": 0.2, "Мана": 0.1}
-        elif hero == "Invoker" or hero == "Cristal maiden":
-            # Маги/саппорты
-            weights = {"Здоровье": 0.25, "Броня": 0.2, "Урон": 0.1, "Скорость атаки": 0.1, "Мана": 0.35}
-        else:
-            weights = {"Здоровье": 0.25, "Броня": 0.25, "Урон": 0.2, "Скорость атаки": 0.2, "Мана": 0.1}
-        
-        # Расчет общего влияния на винрейт
-        total_impact = (
-            health_change_pct * weights["Здоровье"] * 0.3 +  # Здоровье влияет умеренно
-            armor_change_abs * 10 * weights["Броня"] * 0.25 +  # Броня сильно влияет
-            damage_change_pct * weights["Урон"] * 0.4 +  # Урон сильно влияет на урон-ориентированных
-            attack_speed_change_pct * weights["Скорость атаки"] * 0.35 +  # Скорость атаки умеренно влияет
-            mana_change_pct * weights["Мана"] * 0.2  # Мана слабо влияет для не-магов
+        # Та же векторизованная модель, что и в массовом анализе, для одного сценария
+        impact = evaluate_impact(
+            [current_params[name] for name in IMPACT_PARAMS],
+            [proposed_params[name] for name in IMPACT_PARAMS],
+            [get_role_weights(hero)[name] for name in IMPACT_PARAMS],
+            current_winrate,
+            get_impact_predictor(impact_model, stats_patch)
         )
-        
-        # Ограничиваем диапазон изменения винрейта
-        delta = max(-15, min(15, total_impact))
-        new_winrate = max(30, min(70, WINRATES[hero] + delta))
+        health_change_pct, armor_change_abs, damage_change_pct, \
+            attack_speed_change_pct, mana_change_pct = impact["changes"]
+        delta = float(impact["delta"])
+        new_winrate = float(impact["new_winrate"])
         
         st.subheader("📊 Результаты анализа баланса")
         
@@ -218,60 +1706,49 @@ with tab2:
         col_res1, col_res2, col_res3 = st.columns(3)
         
         with col_res1:
-            st.metric("Текущий винрейт", f"{WINRATES[hero]}%", 
+            st.metric("Текущий винрейт", f"{current_winrate}%", 
                      delta=f"{delta:.1f}%", delta_color="inverse" if delta > 5 or delta < -5 else "normal")
             st.metric("Прогнозируемый винрейт", f"{new_winrate:.1f}%")
         
         with col_res2:
-            # Расчет риска на основе величины изменений
-            max_change_pct = max(
-                abs(health_change_pct),
-                abs(damage_change_pct),
-                abs(attack_speed_change_pct),
-                abs(mana_change_pct),
-                abs(armor_change_abs * 5)
-            )
-            
-            if max_change_pct > 25:
-                risk = "🔴 Высокий"
-                risk_color = "red"
-            elif max_change_pct > 15:
-                risk = "🟡 Средний"
-                risk_color = "yellow"
-            else:
-                risk = "🟢 Низкий"
-                risk_color = "green"
-            
-            st.metric("Уровень риска баланса", risk)
-            
-            # Сложность внедрения
-            complexity = "Простая" if max_change_pct < 10 else "Средняя" if max_change_pct < 20 else "Сложная"
-            st.metric("Сложность внедрения", complexity)
+            # Риск и сложность внедрения - по величине максимального изменения
+            st.metric("Уровень риска баланса", RISK_LABELS[impact["risk"]])
+            st.metric("Сложность внедрения", COMPLEXITY_LABELS[impact["complexity"]])
         
         with col_res3:
-            # Эффективность изменений
-            efficiency_score = abs(delta) / max(1, max_change_pct) * 10
-            if efficiency_score > 0.8:
-                efficiency = "Высокая"
-                eff_color = "green"
-            elif efficiency_score > 0.4:
-                efficiency = "Средняя"
-                eff_color = "orange"
-            else:
-                efficiency = "Низкая"
-                eff_color = "red"
-            
-            st.metric("Эффективность изменений", efficiency)
-        
-        # Визуализация весов параметров для этого героя
-        st.subheader("📈 Влияние параметров на винрейт (для данного героя)")
-        df_importance = pd.DataFrame(list(weights.items()), 
-                                     columns=["Параметр", "Вес влияния"])
-        fig3 = px.bar(df_importance.sort_values(by="Вес влияния"), 
-                     x="Вес влияния", y="Параметр", 
-                     orientation='h', color="Вес влияния",
-                     color_continuous_scale="Viridis")
-        st.plotly_chart(fig3, use_container_width=True)
+            st.metric("Эффективность изменений", EFFICIENCY_LABELS[impact["efficiency"]])
+        
+        # Симуляция дуэлей рядом с эвристикой: текущие и предлагаемые параметры
+        st.subheader("⚔️ Симуляция дуэлей (Монте-Карло)")
+        duel_workers = os.cpu_count() if duel_parallel else None
+        duels_before, wins_before, n_duels = run_duel_simulation(
+            hero, current_params, int(duel_fights), duel_workers)
+        duels_after, wins_after, _ = run_duel_simulation(
+            hero, proposed_params, int(duel_fights), duel_workers)
+        low_before, high_before = fight_simulator.wilson_interval(wins_before, n_duels)
+        low_after, high_after = fight_simulator.wilson_interval(wins_after, n_duels)
+        duel_delta = (wins_after - wins_before) / n_duels * 100
+        
+        col_duel1, col_duel2, col_duel3 = st.columns(3)
+        with col_duel1:
+            st.metric("Доля побед в дуэлях сейчас", f"{wins_before / n_duels * 100:.1f}%",
+                      help=f"95% ДИ: {low_before * 100:.1f}–{high_before * 100:.1f}%")
+        with col_duel2:
+            st.metric("После изменений", f"{wins_after / n_duels * 100:.1f}%",
+                      delta=f"{duel_delta:+.1f} п.п.",
+                      help=f"95% ДИ: {low_after * 100:.1f}–{high_after * 100:.1f}%")
+        with col_duel3:
+            st.metric("Эвристика: изменение винрейта", f"{delta:+.1f} п.п.")
+        st.caption(f"{n_duels:,} дуэлей на набор параметров против {len(HEROES) - 1} героев "
+                   "с текущими характеристиками; в скобках подсказок - 95% интервал Уилсона.")
+        st.dataframe(duels_before.merge(duels_after, on="Соперник", suffixes=(" сейчас", " после")),
+                     use_container_width=True, hide_index=True)
+        
+        # Визуализация весов параметров для этого героя (веса есть только у эвристики)
+        if impact_model == IMPACT_MODELS[0]:
+            st.subheader("📈 Влияние параметров на винрейт (для данного героя)")
+            fig3 = build_importance_figure(hero)
+            st.plotly_chart(fig3, use_container_width=True)
         
         # Детальная таблица изменений
         st.subheader("📋 Детализация изменений")
@@ -315,22 +1792,10 @@ with tab2:
         st.subheader("📊 Сравнение старых и новых параметров")
         
         # Подготовка данных для графика
-        params_names = list(current_params.keys())
-        old_values = list(current_params.values())
-        new_values = list(proposed_params.values())
-        
-        fig_comparison = go.Figure(data=[
-            go.Bar(name='Текущие', x=params_names, y=old_values, marker_color='lightblue'),
-            go.Bar(name='Предлагаемые', x=params_names, y=new_values, marker_color='lightgreen')
-        ])
-        
-        fig_comparison.update_layout(
-            barmode='group',
-            title=f"Сравнение параметров героя {hero}",
-            xaxis_title="Параметры",
-            yaxis_title="Значение",
-            showlegend=True
-        )
+        params_names = tuple(current_params.keys())
+        old_values = tuple(current_params.values())
+        new_values = tuple(proposed_params[name] for name in params_names)
+        fig_comparison = build_comparison_figure(hero, params_names, old_values, new_values)
         
         st.plotly_chart(fig_comparison, use_container_width=True)
         
@@ -403,32 +1868,123 @@ with tab2:
                 st.write(f"**Прогнозируемый винрейт:** {new_winrate:.1f}%")
                 st.write("**Сохраненные параметры:**")
                 st.json(proposed_params)
+    
+    # Массовый анализ: сетка изменений параметров для всех героев сразу
+    st.markdown("---")
+    if st.toggle("🧮 Массовый анализ сетки изменений", key="balance_bulk_mode",
+                 help="Оценить сразу тысячи сценариев изменений для всех героев"):
+        bulk_col1, bulk_col2 = st.columns(2)
+        with bulk_col1:
+            bulk_params = st.multiselect(
+                "Изменяемые параметры:", IMPACT_PARAMS,
+                default=["Здоровье", "Урон", "Скорость атаки"],
+                key="balance_bulk_params"
+            )
+            pct_range = st.slider("Диапазон изменений, %", -50, 50, (-20, 20), step=5,
+                                  key="balance_bulk_pct_range")
+            pct_step = st.number_input("Шаг, %", min_value=1, max_value=25, value=5,
+                                       key="balance_bulk_pct_step")
+        with bulk_col2:
+            armor_range = st.slider("Диапазон изменения брони, ед.", -5.0, 5.0, (-2.0, 2.0),
+                                    step=0.5, key="balance_bulk_armor_range")
+            armor_step = st.number_input("Шаг брони, ед.", min_value=0.5, max_value=5.0,
+                                         value=0.5, step=0.5, key="balance_bulk_armor_step")
+            max_risk = st.selectbox("Допустимый риск:", range(len(RISK_LABELS)),
+                                    index=len(RISK_LABELS) - 1,
+                                    format_func=lambda level: f"до {RISK_LABELS[level]}",
+                                    key="balance_bulk_max_risk")
+        
+        # Значения по каждой оси сетки (концы диапазона включительно)
+        axes = {}
+        for name in bulk_params:
+            if name == "Броня":
+                axes[name] = np.arange(armor_range[0], armor_range[1] + armor_step / 2, armor_step)
+            else:
+                axes[name] = np.arange(pct_range[0], pct_range[1] + pct_step / 2, pct_step)
+        n_scenarios = int(np.prod([len(values) for values in axes.values()]))
+        
+        if not axes:
+            st.info("Выберите хотя бы один параметр")
+        elif n_scenarios > MAX_SCENARIOS:
+            st.warning(f"Слишком большая сетка: {n_scenarios:,} сценариев "
+                       f"(максимум {MAX_SCENARIOS:,}). Увеличьте шаг или сузьте диапазон.")
+        else:
+            bulk_started = time.perf_counter()
+            summary, top_frames = run_bulk_scenarios(
+                HEROES, {name: values.tolist() for name, values in axes.items()},
+                get_dashboard_stats(stats_patch)[0], impact_model, stats_patch
+            )
+            st.caption(f"Оценено {n_scenarios:,} сценариев × {len(HEROES)} героев "
+                       f"за {(time.perf_counter() - bulk_started) * 1000:.0f} мс")
+            
+            st.dataframe(summary, use_container_width=True, hide_index=True)
+            
+            st.write(f"**Самые эффективные сценарии для героя {hero}:**")
+            st.dataframe(top_frames[HEROES.index(hero), max_risk],
+                         use_container_width=True, hide_index=True)
+    
+    # Карта чувствительности и автоподбор минимального изменения
+    if st.toggle("🎯 Карта чувствительности и автоподбор", key="balance_sensitivity_mode",
+                 help="Прогноз винрейта на всей сетке значений слайдеров и поиск минимального изменения"):
+        sens_col1, sens_col2 = st.columns(2)
+        with sens_col1:
+            x_param = st.selectbox("Параметр по оси X:", IMPACT_PARAMS,
+                                   index=IMPACT_PARAMS.index("Урон"), key="balance_sens_x")
+        with sens_col2:
+            y_param = st.selectbox("Параметр по оси Y:",
+                                   [name for name in IMPACT_PARAMS if name != x_param],
+                                   key="balance_sens_y")
+        
+        # Остальные параметры фиксированы на текущих значениях слайдеров
+        fig_sensitivity = build_sensitivity_figure(hero, x_param, y_param, proposed_params,
+                                                   current_winrate, impact_model, stats_patch)
+        st.plotly_chart(fig_sensitivity, use_container_width=True)
+        
+        st.write("**Автоподбор минимального изменения:**")
+        opt_col1, opt_col2 = st.columns(2)
+        with opt_col1:
+            target_winrate = st.number_input("Целевой винрейт, %", min_value=30.0, max_value=70.0,
+                                             value=50.0, step=0.5, key="balance_target_winrate")
+        with opt_col2:
+            tolerance = st.number_input("Допуск, %", min_value=0.05, max_value=5.0,
+                                        value=0.5, step=0.05, key="balance_target_tolerance")
+        
+        proposals, n_candidates = find_minimal_changes(hero, target_winrate, tolerance,
+                                                       current_winrate, impact_model, stats_patch)
+        st.caption(f"Проверено {n_candidates:,} вариантов изменения одного или двух параметров")
+        
+        if proposals.empty:
+            st.warning("Не найдено изменений одного-двух параметров, дающих целевой винрейт. "
+                       "Увеличьте допуск.")
+        else:
+            st.dataframe(proposals, use_container_width=True, hide_index=True)
+            best = proposals.iloc[0]
+            st.button("Применить лучший вариант к слайдерам", key="apply_balance_proposal",
+                      on_click=apply_proposal_to_sliders,
+                      args=(hero, {name: best[name] for name in IMPACT_PARAMS}))
 
 # =================== ВКЛАДКА 3: ГЕНЕРАТОР КОНТЕНТА ===================
-with tab3:
+elif active_tab == "Генератор контента":
     st.header("Генерация нового игрового контента")
     
-    item_type = st.selectbox("Тип предмета:", ["Оружие", "Броня", "Артефакт", "Зелье"])
-    style = st.selectbox("Стиль описания:", ["Фэнтези", "Киберпанк", "Исторический", "Мистический"])
+    item_type = st.selectbox("Тип предмета:", ITEM_TYPES, key="item_type")
+    style = st.selectbox("Стиль описания:", ITEM_STYLES, key="item_style")
     
     if st.button("Сгенерировать предмет", type="primary"):
         st.subheader("🎉 Новый предмет создан!")
         
-        # Демо-характеристики
+        # Характеристики - тот же генератор, что и в пакетном режиме (без зерна)
+        item = sample_items(1, item_type)
         characteristics = {
-            "Урон": random.randint(10, 50),
-            "Защита": random.randint(0, 15),
-            "Редкость": random.choice(["Обычный", "Редкий", "Эпический", "Легендарный"]),
-            "Стоимость": random.randint(2000, 7000)
+            "Урон": int(item["damage"][0]),
+            "Защита": int(item["defense"][0]),
+            "Редкость": ITEM_RARITIES[item["rarity"][0]],
+            "Стоимость": int(item["cost"][0])
         }
         
-        # Демо-описание
-        descriptions = {
-            "Фэнтези": f"Древний {item_type.lower()}, испещрённый рунами эльфов. Излучает мягкое свечение.",
-            "Киберпанк": f"Высокотехнологичный {item_type.lower()} с голографическим интерфейсом. Пиксели мерцают неоновым светом.",
-            "Исторический": f"Аутентичный {item_type.lower()} эпохи возрождения. Следы использования говорят о многих битвах.",
-            "Мистический": f"{item_type.capitalize()}, хранящий тайны древних культов. При касании слышен шёпот теней."
-        }
+        # Описание - случайный шаблон для пары (тип, стиль)
+        st.session_state["item_description_variant"] = int(get_description_engine().sample_variants(
+            item_type, style, 1)[0])
         
         col1, col2 = st.columns(2)
         
@@ -437,55 +1993,107 @@ with tab3:
             for key, value in characteristics.items():
                 st.metric(key, value)
             
-            # Оценка баланса
-            balance_score = random.random()
-            if balance_score > 0.7:
-                st.success("✅ Сбалансирован")
-            elif balance_score > 0.4:
-                st.warning("⚠️ Требует доработки")
-            else:
-                st.error("❌ Дисбаланс")
+            # Оценка баланса по модели бюджета силы
+            power, budget, balance_score = score_items(item)
+            balance_level = np.digitize(balance_score[0], ITEM_BALANCE_BINS, right=True)
+            (st.error, st.warning, st.success)[balance_level](
+                f"{ITEM_BALANCE_LABELS[balance_level]} (сила {power[0]:.0f} при бюджете {budget[0]:.0f})")
         
         with col2:
             st.subheader("Описание")
-            st.info(descriptions[style])
-            
-            if style == "Киберпанк" and item_type == "Оружие":
-                st.warning("⚠️ Описание недостаточно соответствует стилю Киберпанк для оружия. Рекомендуется перегенерировать.")
-                if st.button("Перегенерировать описание"):
-                    st.rerun()
+            item_description_fragment(item_type, style, characteristics["Урон"],
+                                      characteristics["Защита"])
+    
+    # Пакетная генерация: тысячи кандидатов, фильтр и лучшие по оценке баланса
+    st.markdown("---")
+    if st.toggle("📦 Пакетная генерация", key="item_batch_mode",
+                 help="Сгенерировать и оценить сразу много предметов выбранного типа"):
+        batch_col1, batch_col2, batch_col3 = st.columns(3)
+        with batch_col1:
+            batch_size = st.number_input("Кандидатов:", min_value=100, max_value=MAX_ITEM_BATCH,
+                                         value=10_000, step=1000, key="item_batch_size")
+            item_seed = st.number_input("Зерно генератора:", min_value=0, value=0, key="item_seed",
+                                        help="Одно и то же зерно даёт ту же партию")
+        with batch_col2:
+            rarities = st.multiselect("Редкость:", ITEM_RARITIES, default=ITEM_RARITIES,
+                                      key="item_rarities")
+            min_score = st.slider("Минимальная оценка баланса:", 0.0, 1.0, 0.7, step=0.05,
+                                  key="item_min_score")
+        with batch_col3:
+            top_n = st.number_input("Показать лучших:", min_value=1, max_value=1000, value=20,
+                                    key="item_top_n")
+        
+        batch_started = time.perf_counter()
+        top_items, n_passed, score_histogram = generate_item_batch(
+            int(batch_size), item_type, style, int(item_seed), tuple(rarities), min_score, int(top_n))
+        st.caption(f"Сгенерировано {int(batch_size):,} предметов, прошли фильтр {n_passed:,} "
+                   f"({(time.perf_counter() - batch_started) * 1000:.0f} мс)")
+        
+        st.bar_chart(pd.DataFrame({"Предметов": score_histogram},
+                                  index=np.round(np.linspace(0.025, 0.975, len(score_histogram)), 3)),
+                     x_label="Оценка баланса")
+        st.dataframe(top_items, use_container_width=True, hide_index=True)
 
 # =================== ВКЛАДКА 4: ЗАГРУЗКА ДАННЫХ ===================
-with tab4:
+elif active_tab == "Загрузка данных":
     st.header("Загрузка и обновление данных")
     
-    data_source = st.radio("Источник данных:", ["OpenDota API", "Локальный файл", "Демо-данные"])
+    data_source = st.radio("Источник данных:", ["OpenDota API", "Локальный файл", "Демо-данные"],
+                           key="data_source")
+    patch = st.text_input("Патч загружаемых матчей:", value=CURRENT_PATCH, key="data_patch").strip()
+    patch_valid = PATCH_PATTERN.fullmatch(patch) is not None
+    if not patch_valid:
+        st.error("Патч должен иметь вид 7.37 или 7.37c - задачи загрузки не запускаются")
     
     if data_source == "OpenDota API":
-        matches_limit = st.number_input("Количество матчей:", min_value=10, max_value=10000, value=100)
-        if st.button("Загрузить данные с OpenDota"):
-            with st.spinner("Загрузка данных..."):
-                # Имитация загрузки
-                import time
-                time.sleep(2)
-                st.success(f"✅ Загружено {matches_limit} матчей")
+        matches_limit = st.number_input("Количество матчей:", min_value=10, max_value=10000, value=100,
+                                        key="matches_limit")
+        if st.button("Загрузить данные с OpenDota", disabled=not patch_valid):
+            job, started = submit_opendota_job(matches_limit, patch)
+            st.info("Загрузка запущена в фоне" if started
+                    else "Такая загрузка уже выполняется - результат будет общим")
     
     elif data_source == "Локальный файл":
-        uploaded_file = st.file_uploader("Выберите файл (JSON, CSV)", type=["json", "csv"])
+        uploaded_file = st.file_uploader(
+            "Выберите файл (JSON, CSV)", type=["json", "csv"],
+            help="CSV: строки выборов с колонками match_id, hero_id (или hero), win; "
+                 "JSON: JSON Lines с записями матчей OpenDota"
+        )
         if uploaded_file:
-            st.success(f"✅ Файл {uploaded_file.name} загружен")
+            st.success(f"✅ Файл {uploaded_file.name} загружен ({uploaded_file.size / 2 ** 20:.1f} МиБ)")
     
     else:
         st.info("Используются встроенные демо-данные для тестирования.")
     
-    if st.button("Запустить ETL-пайплайн", type="primary"):
-        progress_bar = st.progress(0)
-        for i in range(100):
-            # Имитация процесса
-            import time
-            time.sleep(0.02)
-            progress_bar.progress(i + 1)
-        st.success("✅ Данные обработаны и готовы к анализу")
+    if st.button("Запустить ETL-пайплайн", type="primary", disabled=not patch_valid):
+        if data_source == "OpenDota API":
+            job, started = submit_opendota_job(matches_limit, patch)
+        elif data_source == "Локальный файл" and uploaded_file:
+            job, started = submit_upload_job(uploaded_file, patch)
+        else:
+            job = None
+        
+        if job is None:
+            st.success("✅ Используются демо-данные")
+        elif started:
+            st.info("ETL-пайплайн запущен в фоне, прогресс - ниже")
+        else:
+            st.info("Такая задача уже выполняется - результат будет общим")
+    
+    # Фоновые задачи: пока есть активные, фрагмент опрашивает их статус,
+    # не перезапуская остальной скрипт
+    job_runner = get_job_runner()
+    if job_runner.jobs():
+        st.subheader("Фоновые задачи")
+        if job_runner.has_active():
+            render_jobs_live()
+        else:
+            render_jobs(job_runner)
+    
+    if patch in list_store_patches():
+        st.subheader(f"Агрегированная статистика героев (патч {patch})")
+        st.dataframe(get_hero_stats(patch), use_container_width=True, hide_index=True)
 
 # =================== ФУТЕР ===================
 st.markdown("---")
+st.caption(f"Время выполнения скрипта: {(time.perf_counter() - _rerun_started) * 1000:.0f} мс")
@@ -0,0 +1,125 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Порядок характеристик в массивах параметров героя (как в HERO_STATS)
+STAT_NAMES = ("Здоровье", "Броня", "Урон", "Скорость атаки", "Мана")
+HP, ARMOR, DAMAGE, ATTACK_SPEED, MANA = range(len(STAT_NAMES))
+
+# Базовое время атаки: интервал между ударами = BASE_ATTACK_TIME / (скорость атаки / 100)
+BASE_ATTACK_TIME = 1.7
+# Снижение физического урона бронёй: 0.06 * a / (1 + 0.06 * |a|)
+ARMOR_FACTOR = 0.06
+# Разброс урона удара: равномерно в [1 - DAMAGE_SPREAD, 1 + DAMAGE_SPREAD] от базового
+DAMAGE_SPREAD = 0.1
+# Заклинание в начале боя: магический урон (без учёта брони) на единицу маны
+NUKE_DAMAGE_PER_MANA = 0.5
+# Доля здоровья к началу стычки: равномерно в этом диапазоне (бой редко начинается с полного HP)
+START_HP_RANGE = (0.6, 1.0)
+# Боёв в одном куске векторизованного расчёта (ограничивает память на матрицу ударов)
+CHUNK_FIGHTS = 8192
+
+
+def armor_multiplier(armor):
+    """Доля физического урона, проходящая через броню (отрицательная броня увеличивает урон)"""
+    armor = np.asarray(armor, dtype=np.float64)
+    return 1 - ARMOR_FACTOR * armor / (1 + ARMOR_FACTOR * np.abs(armor))
+
+
+def attack_interval(attack_speed):
+    """Секунд между ударами"""
+    return BASE_ATTACK_TIME / (np.asarray(attack_speed, dtype=np.float64) / 100)
+
+
+def time_to_kill(rng, attacker, defender):
+    """
+    Время, за которое attacker убивает defender, для пачки боёв
+
+    attacker и defender - массивы (n, характеристики) в порядке STAT_NAMES.
+    У defender к началу боя случайная доля здоровья из START_HP_RANGE.
+    Бой начинается с заклинания на всю ману, затем удары с интервалом
+    атаки; первый удар - в случайный момент первого интервала.
+    """
+    n = len(attacker)
+    hit = attacker[:, DAMAGE] * armor_multiplier(defender[:, ARMOR])
+    start_hp = defender[:, HP] * rng.uniform(*START_HP_RANGE, n)
+    remaining = start_hp - attacker[:, MANA] * NUKE_DAMAGE_PER_MANA
+    interval = attack_interval(attacker[:, ATTACK_SPEED])
+
+    # Сколько ударов нужно: накопленная сумма случайных ударов до порога HP
+    max_hits = max(1, int(np.ceil((remaining / (hit * (1 - DAMAGE_SPREAD))).max())))
+    damage = rng.uniform(1 - DAMAGE_SPREAD, 1 + DAMAGE_SPREAD, (n, max_hits))
+    damage *= hit[:, None]
+    np.cumsum(damage, axis=1, out=damage)
+    hits = (damage < remaining[:, None]).sum(axis=1) + 1
+
+    first_hit = rng.uniform(0, interval)
+    return np.where(remaining <= 0, 0.0, first_hit + (hits - 1) * interval)
+
+
+def _simulate_block(hero, opponents, n_fights, seed):
+    """Победы героя над каждым соперником за n_fights дуэлей с каждым"""
+    rng = np.random.default_rng(seed)
+    n_opponents = len(opponents)
+    opponent_index = np.repeat(np.arange(n_opponents), n_fights)
+    wins = np.zeros(n_opponents, dtype=np.int64)
+
+    for start in range(0, len(opponent_index), CHUNK_FIGHTS):
+        index = opponent_index[start:start + CHUNK_FIGHTS]
+        attacker = np.broadcast_to(hero, (len(index), len(STAT_NAMES)))
+        defender = opponents[index]
+        hero_time = time_to_kill(rng, attacker, defender)
+        opponent_time = time_to_kill(rng, defender, attacker)
+        # Одновременная гибель - ничья, разыгрывается монеткой
+        coin = rng.random(len(index)) < 0.5
+        won = (hero_time < opponent_time) | ((hero_time == opponent_time) & coin)
+        wins += np.bincount(index[won], minlength=n_opponents)
+    return wins
+
+
+def _simulate_block_args(args):
+    return _simulate_block(*args)
+
+
+def simulate_duels(hero, opponents, n_fights=10000, seed=None, n_workers=None, executor=None):
+    """
+    Монте-Карло дуэлей героя с каждым соперником
+
+    hero: характеристики героя (в порядке STAT_NAMES)
+    opponents: матрица (соперники, характеристики)
+    n_fights: дуэлей с каждым соперником
+    seed: зерно; при одних seed и n_workers результат воспроизводим
+    n_workers: число процессов для больших пачек (None - в текущем процессе);
+               потоки случайных чисел процессов - из SeedSequence.spawn
+    executor: пул процессов для блоков (concurrent.futures); без него на время
+              вызова создаётся пул со способом запуска spawn - fork
+              многопоточного процесса (например, сервера Streamlit) может
+              зависнуть на унаследованных блокировках
+    Возвращает вектор побед героя над каждым соперником.
+    """
+    hero = np.asarray(hero, dtype=np.float64)
+    opponents = np.atleast_2d(np.asarray(opponents, dtype=np.float64))
+    n_blocks = max(1, n_workers or 1)
+    seeds = np.random.SeedSequence(seed).spawn(n_blocks)
+    # Дуэли делятся между блоками поровну (первые блоки берут остаток)
+    sizes = [n_fights // n_blocks + (i < n_fights % n_blocks) for i in range(n_blocks)]
+    tasks = [(hero, opponents, size, block_seed) for size, block_seed in zip(sizes, seeds)]
+
+    if n_blocks == 1:
+        return _simulate_block(*tasks[0])
+    if executor is not None:
+        return np.sum(list(executor.map(_simulate_block_args, tasks)), axis=0)
+    with ProcessPoolExecutor(n_blocks, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return np.sum(list(pool.map(_simulate_block_args, tasks)), axis=0)
+
+
+def wilson_interval(wins, n, z=1.96):
+    """Доверительный интервал Уилсона для доли побед (по умолчанию 95%)"""
+    wins = np.asarray(wins, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    p = wins / n
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return np.clip(center - half_width, 0, 1), np.clip(center + half_width, 0, 1)
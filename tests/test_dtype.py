@@ -0,0 +1,50 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 1.py нельзя импортировать обычным import - загружаем по пути
+_spec = importlib.util.spec_from_file_location("simple_nn", Path(__file__).resolve().parents[1] / "1.py")
+simple_nn = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = simple_nn
+_spec.loader.exec_module(simple_nn)
+
+
+def _float_arrays(obj):
+    """Все массивы с плавающей точкой среди атрибутов объекта (и значений словаря)"""
+    values = obj.values() if isinstance(obj, dict) else vars(obj).values()
+    return [value for value in values
+            if isinstance(value, np.ndarray) and np.issubdtype(value.dtype, np.floating)]
+
+
+@pytest.mark.parametrize("use_workspace", [True, False])
+@pytest.mark.parametrize("optimizer", list(simple_nn.OPTIMIZERS))
+def test_float32_hot_path(optimizer, use_workspace):
+    """Во float32-модели в горячем пути не появляется ни одного массива float64"""
+    X, y = simple_nn.generate_nonlinear_data(256, dtype=np.float32)
+    nn = simple_nn.SimpleNeuralNetwork(input_size=1, hidden_size=8, output_size=1, seed=0,
+                                       optimizer=optimizer, dtype=np.float32,
+                                       use_workspace=use_workspace)
+    nn.train(X, y, epochs=3, verbose=False, batch_size=32, validation_split=0.25)
+
+    assert nn.params.dtype == np.float32
+    for layer in (nn.W1, nn.b1, nn.W2, nn.b2):
+        assert layer.dtype == np.float32
+
+    if use_workspace:
+        for array in _float_arrays(nn._workspace):
+            assert array.dtype == np.float32
+
+    state = _float_arrays(nn.optimizer)
+    # Обычный SGD без workspace обновляет веса напрямую, без буферов оптимизатора
+    if use_workspace or optimizer != "sgd":
+        assert state, "оптимизатор не создал буферов состояния"
+    for array in state:
+        assert array.dtype == np.float32
+
+    assert nn.predict(X).dtype == np.float32
+    assert nn.predict(X, chunk_size=50).dtype == np.float32
+    for chunk in nn.predict_stream(iter(X), chunk_size=64):
+        assert chunk.dtype == np.float32
@@ -0,0 +1,109 @@
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 1488.py - скрипт Streamlit; без сервера он выполняется в "голом" режиме,
+# а fight_simulator импортируется из корня репозитория
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+_spec = importlib.util.spec_from_file_location("balance_app", ROOT / "1488.py")
+app = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = app
+_spec.loader.exec_module(app)
+
+
+def _match(radiant_team, dire_team, radiant_win=True, match_id=1):
+    return {"match_id": match_id, "radiant_team": radiant_team, "dire_team": dire_team,
+            "radiant_win": radiant_win}
+
+
+def _random_matches(n, seed=0):
+    """Матчи со случайными составами из 10 разных героев"""
+    rng = np.random.default_rng(seed)
+    matches = []
+    for match_id in range(n):
+        heroes = rng.choice(np.arange(1, app.MAX_HERO_ID + 1), 10, replace=False).tolist()
+        matches.append(_match(heroes[:5], heroes[5:], bool(rng.random() < 0.5), match_id))
+    return matches
+
+
+def test_parse_match_batch_team_formats():
+    radiant, dire, radiant_win = app.parse_match_batch([
+        _match([1, 2, 3, 4, 5], [6, 7, 8, 9, 10], True),
+        _match("11,12,13,14,15", "16,17,18,19,20", False),
+    ])
+    assert radiant.tolist() == [[1, 2, 3, 4, 5], [11, 12, 13, 14, 15]]
+    assert dire.tolist() == [[6, 7, 8, 9, 10], [16, 17, 18, 19, 20]]
+    assert radiant_win.tolist() == [True, False]
+
+
+@pytest.mark.parametrize("record", [
+    _match([1, 2, 3, 4], [6, 7, 8, 9, 10]),
+    _match("1,2,3,4,5", ""),
+    _match([1, 2, 3, 4, 5], None),
+    _match([1, 2, 3, 4, 5], [6, 7, 8, 9, 10], radiant_win=None),
+    _match([1, 2, 3, 4, 5], [6, 7, 8, 9, app.MAX_HERO_ID + 1]),
+    _match([-1, 2, 3, 4, 5], [6, 7, 8, 9, 10]),
+])
+def test_parse_match_batch_skips_invalid(record):
+    valid = _match([1, 2, 3, 4, 5], [6, 7, 8, 9, 10])
+    radiant, dire, radiant_win = app.parse_match_batch([record, valid])
+    assert radiant.shape == dire.shape == (1, 5)
+    assert radiant_win.tolist() == [True]
+
+
+def test_aggregator_counts():
+    aggregator = app.HeroAggregator()
+    aggregator.update_records([
+        _match([1, 2, 3, 4, 5], [6, 7, 8, 9, 10], True),
+        _match([1, 6, 11, 12, 13], [2, 7, 14, 15, 16], False),
+        _match([1, 2, 3, 4, app.MAX_HERO_ID + 5], [6, 7, 8, 9, 10], True),
+    ])
+    assert aggregator.matches == 2
+    assert aggregator.skipped == 1
+    assert aggregator.picks[[1, 2, 6, 7, 11, 14]].tolist() == [2, 2, 2, 2, 1, 1]
+    assert aggregator.wins[[1, 2, 6, 7, 11, 14]].tolist() == [1, 2, 0, 1, 0, 1]
+    assert aggregator.picks.sum() == 20
+    assert aggregator.wins.sum() == 10
+
+
+def test_aggregator_pair_invariants():
+    aggregator = app.HeroAggregator()
+    matches = _random_matches(500)
+    for start in range(0, len(matches), 64):
+        aggregator.update_records(matches[start:start + 64])
+
+    games, wins = aggregator.matchup_games, aggregator.matchup_wins
+    # Каждая пара противников учтена в обеих ориентациях, победа - у одного из двух
+    assert np.array_equal(wins + wins.T, games)
+    assert np.array_equal(games, games.T)
+    assert games.sum() == 2 * 25 * aggregator.pair_matches
+    assert np.array_equal(aggregator.synergy_games, aggregator.synergy_games.T)
+    assert aggregator.synergy_games.sum() == 2 * 2 * 10 * aggregator.pair_matches
+    assert np.all(aggregator.synergy_wins <= aggregator.synergy_games)
+    # У героя против всех соперников - 5 игр за каждый выбор
+    assert np.array_equal(games.sum(axis=1), 5 * aggregator.picks)
+
+
+@pytest.mark.parametrize("batch_size", [7, 100])
+def test_run_etl_json_lines_limit(tmp_path, batch_size):
+    matches = _random_matches(250, seed=1)
+    path = tmp_path / "matches.jsonl"
+    path.write_text("\n".join(json.dumps(match) for match in matches) + "\n", encoding="utf-8")
+
+    reported = []
+    aggregator = app.run_etl(app.JsonLinesSource(str(path), batch_size=batch_size), 120,
+                             progress=lambda processed, limit: reported.append(processed))
+    assert aggregator.matches == 120
+    assert reported[-1] == 120
+    assert all(0 < size <= batch_size for size in np.diff([0] + reported))
+
+    expected = app.HeroAggregator()
+    expected.update_records(matches[:120])
+    assert np.array_equal(aggregator.picks, expected.picks)
+    assert np.array_equal(aggregator.wins, expected.wins)
+    assert np.array_equal(aggregator.matchup_wins, expected.matchup_wins)